@@ -1,13 +1,14 @@
 from services.bitrix_chat_service import BitrixChatService
 from utils.logger import log_message
-from services.bot_service import BotService, EmbeddingsBotService
 from config import Config
+from services.webhook_dispatcher import WebhookDispatcher, OVERLOADED
+from services.http_client import outbound_client
+from services.outbound_queue import OutboundQueue, Channel
 import subprocess
 import sys
-import requests
 from flask import Flask, request, jsonify, redirect
 import json
-from typing import Dict, Optional
+from typing import TYPE_CHECKING, Dict, Optional
 from datetime import datetime
 import os
 import threading
@@ -23,25 +24,48 @@ print("🚀 Starting ORTOS Bot Application...")
 print(f"📊 Config loaded: TELEGRAM_TOKEN = {bool(Config.TELEGRAM_TOKEN)}")
 print(f"📊 Config loaded: GROQ_API_KEY = {bool(Config.GROQ_API_KEY)}")
 
+# services.bot_service тянет groq, а через EmbeddingsService — torch и faiss.
+# Модуль и сервисы загружаются при первом использовании, чтобы /health отвечал сразу
+# после холодного старта машины (см. bench_startup.py и startup_profile.txt)
+if TYPE_CHECKING:
+    from services.bot_service import BotService, EmbeddingsBotService
+
 app = Flask(__name__)
-bot_service = BotService()
-embeddings_bot_service: Optional[EmbeddingsBotService] = None
+bot_service: Optional["BotService"] = None
+embeddings_bot_service: Optional["EmbeddingsBotService"] = None
 bitrix_chat_service = BitrixChatService()
+# Вебхуки отвечают сразу, ответы формируются и отправляются в фоне
+webhook_dispatcher = WebhookDispatcher(
+    Config.WEBHOOK_WORKERS, Config.WEBHOOK_QUEUE_SIZE, Config.WEBHOOK_DEDUP_SIZE)
 
 _init_lock = threading.Lock()
 _init_started = False
+_services_lock = threading.Lock()
+
+
+def get_bot_service() -> "BotService":
+    global bot_service
+    if bot_service is None:
+        with _services_lock:
+            if bot_service is None:
+                from services.bot_service import BotService
+                bot_service = BotService()
+    return bot_service
 
 
-def get_embeddings_bot_service() -> Optional[EmbeddingsBotService]:
+def get_embeddings_bot_service() -> Optional["EmbeddingsBotService"]:
     global embeddings_bot_service
     if embeddings_bot_service is None:
-        try:
-            print("🚀 Создаем экземпляр EmbeddingsBotService...")
-            embeddings_bot_service = EmbeddingsBotService()
-        except Exception as e:
-            print(f"❌ Ошибка инициализации EmbeddingsBotService: {e}")
-            import traceback
-            traceback.print_exc()
+        with _services_lock:
+            if embeddings_bot_service is None:
+                try:
+                    print("🚀 Создаем экземпляр EmbeddingsBotService...")
+                    from services.bot_service import EmbeddingsBotService
+                    embeddings_bot_service = EmbeddingsBotService()
+                except Exception as e:
+                    print(f"❌ Ошибка инициализации EmbeddingsBotService: {e}")
+                    import traceback
+                    traceback.print_exc()
     return embeddings_bot_service
 
 
@@ -57,6 +81,9 @@ def start_background_initialization():
         try:
             print("⏳ Фоновая инициализация EmbeddingsBotService начата...")
             get_embeddings_bot_service()
+            if Config.FEED_WARMUP:
+                get_bot_service().search_service.warm_up(
+                    Config.FEED_WARMUP_EXECUTOR, Config.FEED_WARMUP_WORKERS)
             print("✅ Фоновая инициализация завершена")
         except Exception as e:
             print(f"❌ Ошибка фоновой инициализации: {e}")
@@ -83,26 +110,100 @@ def telegram_webhook(token):
         print(f"👤 {user_name} ({chat_id}): {text}")
 
         if text:
-            service = get_embeddings_bot_service()
-            if service is None:
-                ai_response = "🔄 Бот запускается. Попробуйте ещё раз через минуту."
-            else:
-                print("🧠 EmbeddingsBotService получен")
-                ai_response = service.process_question(
-                    text, user_id=str(chat_id))
-            log_message(user_name, chat_id, text, ai_response)
-
-            print(f"📤 Отправляем ответ в Telegram: {ai_response[:100]}")
-            requests.post(
-                Config.TELEGRAM_URL + "/sendMessage",
-                json={"chat_id": chat_id, "text": ai_response}
-            )
+            update_id = data.get('update_id')
+            status = webhook_dispatcher.submit(
+                f"telegram:{update_id}" if update_id is not None else None,
+                lambda timings: answer_telegram(chat_id, user_name, text, timings))
+            if status == OVERLOADED:
+                # Telegram повторит доставку неуспешного вебхука позже
+                print("⚠️ Очередь обработки сообщений переполнена")
+                return jsonify({"status": status}), 503
+            return jsonify({"status": status})
 
         return jsonify({"status": "ok"})
 
     except Exception as e:
         print(f"❌ Ошибка webhook: {e}")
         return jsonify({"error": str(e)}), 500
+
+
+def record_stage(timings: Optional[Dict[str, float]], stage: str, started: float) -> None:
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+def deliver_telegram(chat_id, text) -> bool:
+    """Отправка одного сообщения в Telegram (вызывается потоками очереди отправки)"""
+    response = outbound_client.post(
+        Config.TELEGRAM_URL + "/sendMessage",
+        json={"chat_id": chat_id, "text": text}
+    )
+    if response.status_code != 200:
+        print(f"❌ Telegram не принял сообщение: {response.status_code} - {response.text}")
+        return False
+    return True
+
+
+def deliver_bitrix(dialog_id, text) -> bool:
+    """Отправка одного сообщения в Bitrix24 через imbot.message.add (потоки очереди отправки)"""
+    response = outbound_client.post(
+        "https://b24-sdgm61.bitrix24.by/rest/1/ummeoyhga98c0xoa/imbot.message.add",
+        json={
+            "BOT_ID": "36",
+            "CLIENT_ID": "hk6ov2nmxj1keecgsr8sknzjzs4xs94i",
+            "DIALOG_ID": dialog_id,
+            "MESSAGE": text
+        }
+    )
+    if response.status_code != 200:
+        print(f"❌ Failed to send response: {response.status_code} - {response.text}")
+        return False
+    print("✅ Response sent successfully via imbot.message.add")
+    return True
+
+
+# Ответы не отправляются из обработчиков: очередь соблюдает порядок сообщений в чате
+# и лимиты Telegram / Bitrix24, длинные ответы делит на части
+outbound_queue = OutboundQueue([
+    Channel('telegram', deliver_telegram, Config.TELEGRAM_RATE_PER_SEC,
+            Config.TELEGRAM_CHAT_INTERVAL, Config.OUTBOUND_MAX_MESSAGE_LENGTH),
+    Channel('bitrix', deliver_bitrix, Config.BITRIX_RATE_PER_SEC,
+            Config.BITRIX_CHAT_INTERVAL, Config.OUTBOUND_MAX_MESSAGE_LENGTH),
+], Config.OUTBOUND_WORKERS, Config.OUTBOUND_QUEUE_SIZE)
+
+
+def answer_telegram(chat_id, user_name, text, timings=None):
+    """Формирует и отправляет ответ на сообщение Telegram (в пуле обработчиков)"""
+    try:
+        service = get_embeddings_bot_service()
+        if service is None:
+            ai_response = "🔄 Бот запускается. Попробуйте ещё раз через минуту."
+        else:
+            print("🧠 EmbeddingsBotService получен")
+            ai_response = service.process_question(
+                text, user_id=str(chat_id),
+                reply=lambda answer: send_telegram_reply(chat_id, user_name, text, answer),
+                timings=timings)
+            if ai_response is None:
+                # Индекс прогревается: ответ отправит очередь ожидания
+                return
+    except Exception as e:
+        print(f"❌ AI processing error: {e}")
+        ai_response = "Извините, произошла ошибка. Попробуйте позже."
+    send_telegram_reply(chat_id, user_name, text, ai_response, timings)
+
+
+def send_telegram_reply(chat_id, user_name, text, ai_response, timings=None):
+    """Логирует ответ и ставит его в очередь отправки в Telegram"""
+    started = time.perf_counter()
+    log_message(user_name, chat_id, text, ai_response)
+    record_stage(timings, 'log', started)
+
+    print(f"📤 Ставим ответ в очередь Telegram: {ai_response[:100]}")
+    if not outbound_queue.enqueue('telegram', chat_id, ai_response):
+        print("❌ Очередь отправки переполнена, ответ в Telegram не отправлен")
+
+
 # Bitrix24 Open Lines Webhook
 
 
@@ -199,11 +300,29 @@ def handle_bitrix_message(data):
         return jsonify({"status": "ignored"}), 200
 
     print(f"🤖 Processing message through AI...")
+    message_id = data.get('data[PARAMS][MESSAGE_ID]', '') or data.get(
+        'data', {}).get('MESSAGE_ID', '')
+    status = webhook_dispatcher.submit(
+        f"bitrix:{message_id}" if message_id else None,
+        lambda timings: answer_bitrix(dialog_id, user_id, message, timings))
+    if status == OVERLOADED:
+        print("⚠️ Очередь обработки сообщений переполнена")
+        return jsonify({"status": status}), 503
+    return jsonify({"status": status})
+
+
+def answer_bitrix(dialog_id, user_id, message, timings=None):
+    """Формирует и отправляет ответ в открытую линию Bitrix24 (в пуле обработчиков)"""
     try:
         service = get_embeddings_bot_service()
         if service is not None:
             ai_response = service.process_question(
-                message, user_id=str(user_id or dialog_id))
+                message, user_id=str(user_id or dialog_id),
+                reply=lambda answer: send_bitrix_reply(dialog_id, user_id, message, answer),
+                timings=timings)
+            if ai_response is None:
+                print("⏳ Сообщение поставлено в очередь до готовности индекса")
+                return
             print(f"🤖 AI Response: {ai_response[:100]}...")
         else:
             ai_response = "🔄 Бот запускается. Попробуйте позже."
@@ -212,32 +331,17 @@ def handle_bitrix_message(data):
         print(f"❌ AI processing error: {e}")
         ai_response = "Извините, произошла ошибка. Попробуйте позже."
 
-    # Отправляем ответ в Bitrix24 через imbot.message.add
-    print(f"📤 Sending response to Bitrix24...")
-    try:
-        response = requests.post(
-            "https://b24-sdgm61.bitrix24.by/rest/1/ummeoyhga98c0xoa/imbot.message.add",
-            json={
-                "BOT_ID": "36",
-                "CLIENT_ID": "hk6ov2nmxj1keecgsr8sknzjzs4xs94i",
-                "DIALOG_ID": dialog_id,
-                "MESSAGE": ai_response
-            },
-            timeout=10
-        )
-
-        if response.status_code == 200:
-            print("✅ Response sent successfully via imbot.message.add")
-            log_message(f"BitrixUser_{user_id}",
-                        dialog_id, message, ai_response)
-        else:
-            print(
-                f"❌ Failed to send response: {response.status_code} - {response.text}")
+    send_bitrix_reply(dialog_id, user_id, message, ai_response, timings)
 
-    except Exception as e:
-        print(f"❌ Error sending to Bitrix24: {e}")
 
-    return jsonify({"status": "ok"})
+def send_bitrix_reply(dialog_id, user_id, message, ai_response, timings=None):
+    """Ставит ответ в очередь отправки в Bitrix24; в лог он попадает после доставки"""
+    print(f"📤 Queueing response to Bitrix24...")
+    queued = outbound_queue.enqueue(
+        'bitrix', dialog_id, ai_response,
+        on_sent=lambda: log_message(f"BitrixUser_{user_id}", dialog_id, message, ai_response))
+    if not queued:
+        print("❌ Очередь отправки переполнена, ответ в Bitrix24 не отправлен")
 
 
 def transfer_to_operator(dialog_id, user_id, chat_id):
@@ -247,48 +351,53 @@ def transfer_to_operator(dialog_id, user_id, chat_id):
             print("⚠️ chat_id не найден, невозможно передать оператору")
             return jsonify({"status": "error", "message": "no_chat_id"}), 400
 
-        # 1️⃣ Сообщаем клиенту, что оператор подключится
+        # 1️⃣ Сообщаем клиенту, что оператор подключится;
+        # 2️⃣ чат передается контакт-центру отдельной задачей очереди после доставки сообщения.
+        # Перевод выполняется асинхронно, поэтому отвечаем 202 "queued", а сбой — в логе
         client_text = "👩‍💼 Оператор сейчас подключится. Пожалуйста, ожидайте."
-        client_response = requests.post(
-            "https://b24-sdgm61.bitrix24.by/rest/1/ummeoyhga98c0xoa/imbot.message.add",
-            json={
-                "BOT_ID": "36",
-                "CLIENT_ID": "hk6ov2nmxj1keecgsr8sknzjzs4xs94i",
-                "DIALOG_ID": dialog_id,
-                "MESSAGE": client_text
-            },
-            timeout=10
-        )
-
-        if client_response.status_code != 200:
-            print(f"❌ Ошибка при отправке клиенту: {client_response.text}")
-            return jsonify({"status": "error"}), 500
-
-        print("✅ Сообщение клиенту отправлено")
-
-        # 2️⃣ Передаём чат в контакт-центр (именно этот метод)
-        transfer_response = requests.post(
-            "https://b24-sdgm61.bitrix24.by/rest/1/ummeoyhga98c0xoa/imopenlines.bot.session.operator",
-            json={
-                "CHAT_ID": chat_id
-            },
-            timeout=10
-        )
-
-        if transfer_response.status_code == 200:
-            print("✅ Чат передан контакт-центру")
-            print(f"📨 Ответ Bitrix24: {transfer_response.text}")
-        else:
-            print(
-                f"❌ Ошибка при передаче в контакт-центр: {transfer_response.text}")
+        queued = outbound_queue.enqueue(
+            'bitrix', dialog_id, client_text,
+            on_sent=lambda: queue_operator_request(dialog_id, chat_id),
+            on_failed=lambda: print(
+                f"❌ Перевод на оператора не выполнен: сообщение клиенту не доставлено (чат {chat_id})"))
+        if not queued:
+            print("❌ Очередь отправки переполнена, перевод на оператора не выполнен")
+            return jsonify({"status": "overloaded"}), 503
 
-        return jsonify({"status": "transferred"})
+        return jsonify({"status": "queued"}), 202
 
     except Exception as e:
         print(f"❌ Ошибка перевода на оператора: {e}")
         return jsonify({"status": "error"}), 500
 
 
+def queue_operator_request(dialog_id, chat_id):
+    """Ставит перевод чата на операторов в очередь Bitrix24 (следом за сообщениями диалога)"""
+    queued = outbound_queue.enqueue_call(
+        'bitrix', dialog_id, lambda: request_operator(chat_id), "imopenlines.bot.session.operator",
+        on_failed=lambda: print(f"❌ Перевод на оператора не выполнен: чат {chat_id} не передан контакт-центру"))
+    if not queued:
+        print(f"❌ Очередь отправки переполнена, перевод на оператора не выполнен (чат {chat_id})")
+
+
+def request_operator(chat_id):
+    """Передаёт чат в контакт-центр (именно этот метод); True — Bitrix24 принял перевод"""
+    transfer_response = outbound_client.post(
+        "https://b24-sdgm61.bitrix24.by/rest/1/ummeoyhga98c0xoa/imopenlines.bot.session.operator",
+        json={
+            "CHAT_ID": chat_id
+        }
+    )
+
+    if transfer_response.status_code == 200:
+        print("✅ Чат передан контакт-центру")
+        print(f"📨 Ответ Bitrix24: {transfer_response.text}")
+        return True
+    print(
+        f"❌ Ошибка при передаче в контакт-центр: {transfer_response.text}")
+    return False
+
+
 def handle_welcome_message(data):
     """Приветственное сообщение"""
     print("🎉 Welcome message triggered")
@@ -312,22 +421,10 @@ def handle_welcome_message(data):
         'data', {}).get('DIALOG_ID', '')
 
     if dialog_id:
-        try:
-            response = requests.post(
-                "https://b24-sdgm61.bitrix24.by/rest/1/ummeoyhga98c0xoa/imbot.message.add",
-                json={
-                    "BOT_ID": "36",
-                    "CLIENT_ID": "hk6ov2nmxj1keecgsr8sknzjzs4xs94i",
-                    "DIALOG_ID": dialog_id,
-                    "MESSAGE": welcome_text
-                }
-            )
-            if response.status_code == 200:
-                print("✅ Welcome message sent")
-            else:
-                print(f"❌ Failed to send welcome message: {response.text}")
-        except Exception as e:
-            print(f"❌ Error sending welcome message: {e}")
+        if outbound_queue.enqueue('bitrix', dialog_id, welcome_text):
+            print("✅ Welcome message queued")
+        else:
+            print("❌ Очередь отправки переполнена, приветствие не отправлено")
 
     return jsonify({"status": "welcome_sent"})
 
@@ -347,7 +444,7 @@ def bitrix_debug():
         test_url = f"{Config.BITRIX_WEBHOOK_URL}/profile"
 
         try:
-            response = requests.post(test_url, timeout=10)
+            response = outbound_client.post(test_url, retries=0)
             debug_info.append(f"   URL: {test_url}")
             debug_info.append(f"   Статус: {response.status_code}")
 
@@ -377,15 +474,52 @@ def bitrix_debug():
 # Остальные маршруты...
 
 
+@app.route('/api/search', methods=['POST'])
+def api_search():
+    """Поиск по базе знаний без генерации ответа LLM (используется bench_serving.py)"""
+    data = request.get_json(silent=True) or {}
+    query = data.get('query', '')
+    top_k = int(data.get('top_k', 7))
+
+    service = get_embeddings_bot_service()
+    if service is None or not service.is_ready():
+        return jsonify({"error": "not_ready"}), 503
+    try:
+        results = service.embeddings_service.search(query, top_k=top_k)
+    except Exception as e:
+        print(f"❌ Ошибка /api/search: {e}")
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"results": [
+        {"id": doc['id'], "type": doc['type'], "score": score} for doc, score in results
+    ]})
+
+
 @app.route('/health')
 def health_check():
     """Health check для Fly.io"""
-    return jsonify({"status": "ok", "embeddings_ready": embeddings_bot_service is not None}), 200
+    service = embeddings_bot_service
+    ready = service is not None and service.is_ready()
+    queue = service.pending_queue.get_stats() if service is not None else None
+    completions = service.completion_cache.get_stats() if service is not None else None
+    similar = service.semantic_cache.get_stats() if service is not None else None
+    return jsonify({
+        "status": "ok",
+        "embeddings_ready": ready,
+        "queue_depth": queue['depth'] if queue else 0,
+        "pending_queue": queue,
+        "webhooks": webhook_dispatcher.get_stats(),
+        "outbound_http": outbound_client.get_stats(),
+        "outbound_queue": outbound_queue.get_stats(),
+        "completion_cache": completions,
+        "semantic_cache": similar,
+        "bot_cache": bot_service.get_cache_stats() if bot_service is not None else None,
+    }), 200
 
 
 @app.route('/')
 def home():
-    status = "✅ Готов" if embeddings_bot_service else "⏳ Инициализируется (обновите через 30с)"
+    ready = embeddings_bot_service is not None and embeddings_bot_service.is_ready()
+    status = "✅ Готов" if ready else "⏳ Инициализируется (обновите через 30с)"
     return f"""
     <h1>🤖 Консультант по индивидуальным стелькам ORTOS</h1>
     <p style="color: #666; font-size: 14px;">Статус: {status}</p>
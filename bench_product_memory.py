@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Замер памяти на один товар: прежний Product (@dataclass с __dict__ и отдельным params на каждый offer)
+против текущего (slots + интернирование строк + общие словари params внутри фида).
+
+Каждый вариант считается в отдельном интерпретаторе, чтобы интернированные строки
+одного замера не попадали в другой.
+
+Запуск: python bench_product_memory.py [путь_к_фиду]
+"""
+import io
+import gc
+import sys
+import subprocess
+import tracemalloc
+import contextlib
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+
+@dataclass
+class LegacyProduct:
+    id: str
+    name: str
+    price: str
+    url: str
+    quantity: str
+    category_id: str
+    category_name: Optional[str] = None
+    params: Dict = None
+
+
+def _text(offer: ET.Element, tag: str, default: str = "") -> str:
+    elem = offer.find(tag)
+    return elem.text if elem is not None else default
+
+
+def build_legacy(feed_path: str) -> List[LegacyProduct]:
+    """Тот же разбор, что был в FeedService.parse_feed до перехода на компактный Product"""
+    root = ET.parse(feed_path).getroot()
+    categories = {c.get('id'): c.text for c in root.findall('.//category') if c.get('id') and c.text}
+    products = []
+    for offer in root.findall('.//offer'):
+        if offer.get('available') != 'true':
+            continue
+        params = {p.get('name'): p.text for p in offer.findall('param') if p.get('name') and p.text}
+        category_id = _text(offer, 'categoryId')
+        products.append(LegacyProduct(
+            id=offer.get('id', ''), name=_text(offer, 'name'), price=_text(offer, 'price'),
+            url=_text(offer, 'url'), quantity=_text(offer, 'step-quantity', '0'),
+            category_id=category_id, category_name=categories.get(category_id), params=params))
+    return products
+
+
+def build_current(feed_path: str) -> List:
+    from services.feed_service import FeedService
+    with contextlib.redirect_stdout(io.StringIO()):
+        return FeedService().load_products(feed_path)
+
+
+def measure(mode: str, feed_path: str) -> None:
+    if mode == 'current':
+        # Импорты не должны попасть в замер
+        import services.feed_service  # noqa: F401
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    products = build_legacy(feed_path) if mode == 'legacy' else build_current(feed_path)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{len(products)} {after - before}")
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--measure':
+        measure(sys.argv[2], sys.argv[3])
+        return
+
+    from config import Config
+    feed_path = sys.argv[1] if len(sys.argv) > 1 else f"{Config.FEEDS_DIR}/gikalo.xml"
+
+    results = {}
+    for mode in ('legacy', 'current'):
+        output = subprocess.run([sys.executable, __file__, '--measure', mode, feed_path],
+                                capture_output=True, text=True, encoding='utf-8', check=True).stdout
+        count, total = output.strip().splitlines()[-1].split()
+        results[mode] = (int(count), int(total))
+
+    count = results['current'][0]
+    legacy = results['legacy'][1] / results['legacy'][0]
+    current = results['current'][1] / count
+    print(f"Фид: {feed_path}, товаров: {count}")
+    print(f"До    (dataclass + __dict__ + params на offer): {legacy:8.1f} байт/товар")
+    print(f"После (slots + intern + общие params):          {current:8.1f} байт/товар")
+    print(f"Экономия: {(1 - current / legacy) * 100:.1f}%")
+
+
+if __name__ == '__main__':
+    main()
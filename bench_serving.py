@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный тест поиска: запросов в секунду у однопроцессного режима (python app.py,
+threaded Flask) против многопроцессного (gunicorn + общий процесс поиска, gunicorn.conf.py).
+
+Каждый режим запускается отдельным процессом на свободном порту; после готовности
+индекса (/health → embeddings_ready) в течение --duration секунд --concurrency потоков
+отправляют POST /api/search с реальными вопросами пользователей. Кэш эмбеддингов
+запросов отключается (QUERY_CACHE_SIZE=0), чтобы каждый запрос кодировался моделью.
+
+Запуск: python bench_serving.py [--modes threaded,gunicorn] [--concurrency 16] [--duration 30]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import threading
+import urllib.request
+from typing import Dict, List
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from config import Config, BASE_DIR
+from utils.helpers import load_sample_questions
+
+MODES = {
+    'threaded': [sys.executable, 'app.py'],
+    'gunicorn': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _get_json(url: str, payload: Dict = None, timeout: float = 30.0) -> Dict:
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def _tree_rss_mb(pid: int) -> float:
+    """Суммарный RSS процесса и всех потомков (Linux, /proc)"""
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    stack.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total / (1024 * 1024)
+
+
+def _wait_ready(base_url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Сервер завершился с кодом {process.returncode}")
+        try:
+            # /api/search заодно запускает ленивую инициализацию сервиса
+            if _get_json(f"{base_url}/health", timeout=2).get('embeddings_ready'):
+                return
+            _get_json(f"{base_url}/api/search", {'query': 'ping'}, timeout=2)
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Индекс не готов за {timeout:.0f}s")
+
+
+def run_load(base_url: str, questions: List[str], concurrency: int, duration: float) -> Dict:
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(offset: int) -> None:
+        i = offset
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                _get_json(f"{base_url}/api/search", {'query': questions[i % len(questions)], 'top_k': 7})
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+            i += concurrency
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.monotonic() - started
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / wall if wall else 0.0,
+        'p50_ms': pick(0.50),
+        'p95_ms': pick(0.95),
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+def bench_mode(mode: str, questions: List[str], args) -> Dict:
+    port = _free_port()
+    env = dict(os.environ, PORT=str(port), QUERY_CACHE_SIZE='0', PYTHONIOENCODING='utf-8')
+    if mode == 'gunicorn':
+        env.setdefault('WEB_CONCURRENCY', str(args.workers))
+        env['SEARCH_WORKER_SOCKET'] = f"/tmp/ortos-search-bench-{port}.sock"
+    base_url = f"http://127.0.0.1:{port}"
+    log = open(os.path.join(args.log_dir, f"bench_serving_{mode}.log"), 'w', encoding='utf-8')
+    process = subprocess.Popen(MODES[mode], cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        ready_start = time.monotonic()
+        _wait_ready(base_url, process, args.ready_timeout)
+        ready_seconds = time.monotonic() - ready_start
+        run_load(base_url, questions, args.concurrency, min(3.0, args.duration))  # прогрев
+        result = run_load(base_url, questions, args.concurrency, args.duration)
+        result['ready_seconds'] = ready_seconds
+        result['rss_mb'] = _tree_rss_mb(process.pid)
+        return result
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест: threaded Flask против gunicorn + процесс поиска")
+    parser.add_argument("--modes", default="threaded,gunicorn")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--ready-timeout", type=float, default=900.0)
+    parser.add_argument("--log-dir", default="/tmp")
+    args = parser.parse_args()
+
+    questions = load_sample_questions(f"{BASE_DIR}/test_results.txt", Config.LOGS_FILE)
+    results = {}
+    for mode in args.modes.split(','):
+        print(f"⏳ Режим {mode}...")
+        results[mode] = bench_mode(mode, questions, args)
+
+    print("\n" + "=" * 90)
+    print(f"Вопросов: {len(questions)}, параллельных клиентов: {args.concurrency}, {args.duration:.0f}s на режим")
+    print(f"{'режим':<10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'ошибки':>7} {'RSS MB':>8} {'готов, s':>9}")
+    for mode, r in results.items():
+        print(f"{mode:<10} {r['rps']:8.1f} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['errors']:7d} "
+              f"{r['rss_mb']:8.0f} {r['ready_seconds']:9.1f}")
+    if 'threaded' in results and 'gunicorn' in results and results['threaded']['rps']:
+        print(f"Ускорение gunicorn / threaded: x{results['gunicorn']['rps'] / results['threaded']['rps']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
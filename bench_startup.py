@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Замер холодного старта app.py: профиль импорта (python -X importtime) и время
+от запуска процесса до первого успешного ответа /health.
+
+На Fly машина поднимается по первому запросу (auto_start_machines, min_machines_running = 0),
+поэтому время до /health — это задержка, которую видит пользователь.
+Тяжелые модули (torch, sentence_transformers, faiss, groq, gspread) не должны
+импортироваться вместе с app — они загружаются фоновой инициализацией.
+
+Запуск: python bench_startup.py [--runs 5] [--target-ms 1000] [--report startup_profile.txt]
+Код возврата 1, если медиана времени до /health выше цели или тяжелый модуль попал в импорт app.
+"""
+import os
+import re
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+from typing import Dict, List, Tuple
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ('torch', 'sentence_transformers', 'transformers', 'faiss', 'onnxruntime', 'groq', 'gspread')
+IMPORTTIME_RE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault('PYTHONIOENCODING', 'utf-8')
+    return env
+
+
+def profile_imports() -> Tuple[float, List[Tuple[str, float]], List[str]]:
+    """Время импорта app (мс), топ модулей верхнего уровня по кумулятивному времени, тяжелые модули"""
+    code = ("import sys, app; "
+            f"print('HEAVY=' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=BASE_DIR, env=_env(), capture_output=True, text=True, encoding='utf-8')
+    if result.returncode != 0:
+        raise RuntimeError(f"import app завершился с ошибкой:\n{result.stderr[-2000:]}")
+
+    # importtime печатает дочерние модули перед родителем: прямые импорты app —
+    # строки глубины 1 между предыдущим модулем верхнего уровня и строкой "app"
+    total_ms = 0.0
+    children: Dict[str, float] = {}
+    top_level: Dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        cumulative_ms = int(match.group(2)) / 1000.0
+        depth = len(match.group(3)) // 2
+        name = match.group(4)
+        if depth == 1:
+            children[name] = children.get(name, 0.0) + cumulative_ms
+        elif depth == 0:
+            if name == 'app':
+                total_ms, top_level = cumulative_ms, children
+            children = {}
+    heavy_line = next((l for l in result.stdout.splitlines() if l.startswith('HEAVY=')), 'HEAVY=')
+    heavy = [m for m in heavy_line[len('HEAVY='):].split(',') if m]
+    ranked = sorted(top_level.items(), key=lambda item: item[1], reverse=True)
+    return total_ms, ranked, heavy
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def time_to_health(timeout: float = 60.0) -> float:
+    """Запускает python app.py и возвращает время (мс) до первого ответа 200 на /health"""
+    port = _free_port()
+    env = _env()
+    env['PORT'] = str(port)
+    url = f"http://127.0.0.1:{port}/health"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, 'app.py'], cwd=BASE_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"app.py завершился с кодом {process.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000.0
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"/health не ответил за {timeout:.0f}s")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Профиль холодного старта app.py")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=1000.0)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--report", default=os.path.join(BASE_DIR, "startup_profile.txt"))
+    args = parser.parse_args()
+
+    import_ms, ranked, heavy = profile_imports()
+    health_ms = [time_to_health() for _ in range(args.runs)]
+    median_ms = statistics.median(health_ms)
+
+    lines = [
+        "Профиль холодного старта app.py (python bench_startup.py)",
+        f"Python {sys.version.split()[0]}, {sys.platform}",
+        "=" * 70,
+        f"import app: {import_ms:.0f} ms",
+        f"Тяжелые модули при импорте app: {', '.join(heavy) if heavy else 'нет'}",
+        "",
+        f"Топ-{args.top} прямых импортов app (кумулятивно, -X importtime):",
+    ]
+    lines += [f"  {name:<40} {ms:8.1f} ms" for name, ms in ranked[:args.top]]
+    lines += [
+        "",
+        f"Время до первого /health ({args.runs} запусков): "
+        f"медиана {median_ms:.0f} ms, min {min(health_ms):.0f} ms, max {max(health_ms):.0f} ms",
+        f"Цель: {args.target_ms:.0f} ms",
+    ]
+    ok = median_ms <= args.target_ms and not heavy
+    lines.append("✅ Цель выполнена" if ok else "❌ Цель не выполнена")
+
+    report = "\n".join(lines)
+    print(report)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        f.write(report + "\n")
+    print(f"\n💾 Отчет сохранен: {args.report}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
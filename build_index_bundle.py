@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Сборка набора индексов при сборке образа (RUN в Dockerfile), чтобы ни одна машина
+не кодировала базу знаний при старте.
+
+Набор в data/embeddings_v2/:
+    semantic.faiss, bm25.json, documents.bin, category_matrix.npy, doc_embeddings.npz
+    query_cache_seed.npz  — эмбеддинги реальных вопросов (test_results.txt, chat_logs.txt)
+    metadata.json         — штамп bundle_version (формат + версия базы знаний + модель),
+                            который проверяет EmbeddingsService.load_indices
+
+После сборки набор загружается заново отдельным экземпляром сервиса: если штамп не принят,
+сборка образа завершается с ошибкой.
+
+Запуск: python build_index_bundle.py [--index-dir DIR] [--seed-limit 1000]
+"""
+import sys
+import time
+import argparse
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from config import Config, BASE_DIR
+from services.embeddings_service import EmbeddingsService, DEFAULT_INDEX_DIR, QUERY_SEED_FILE
+from utils.helpers import load_sample_questions
+
+
+def build_bundle(index_dir: str, seed_limit: int) -> str:
+    start = time.perf_counter()
+    # Кэш запросов только в памяти: в образ попадает лишь seed внутри набора индексов
+    service = EmbeddingsService(query_cache_size=max(seed_limit, 1), query_cache_path=None)
+    service.build_indices(index_dir)
+    service.save_indices(index_dir, built_by="build")
+
+    questions = load_sample_questions(f"{BASE_DIR}/test_results.txt", Config.LOGS_FILE, seed_limit)
+    for question in questions:
+        service.encode_query(question)
+    service.query_cache.save(f"{index_dir}/{QUERY_SEED_FILE}")
+
+    elapsed = time.perf_counter() - start
+    print(f"📦 Набор индексов {service.bundle_version}: {len(service.all_documents)} документов, "
+          f"{len(questions)} вопросов в seed, {elapsed:.1f}s")
+    return service.bundle_version
+
+
+def verify_bundle(index_dir: str, bundle_version: str) -> bool:
+    service = EmbeddingsService(query_cache_path=None)
+    if not service.load_indices(index_dir) or service.bundle_version != bundle_version:
+        print(f"❌ Набор индексов в {index_dir} не принят load_indices")
+        return False
+    print(f"✅ Набор индексов {bundle_version} проверен: {service.get_stats()['query_cache']['size']} запросов в кэше")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка набора индексов для образа")
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    parser.add_argument("--seed-limit", type=int, default=1000)
+    args = parser.parse_args()
+
+    bundle_version = build_bundle(args.index_dir, args.seed_limit)
+    if not verify_bundle(args.index_dir, bundle_version):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
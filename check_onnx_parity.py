@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка, что ONNX int8 бэкенд дает тот же top-k поиска, что и torch.
+
+Вопросы: те же, что прогонялись через test_30_questions.py (test_results.txt),
+дополненные вопросами из data/chat_logs.txt до 30 штук.
+
+Запуск: python check_onnx_parity.py [--top-k 7] [--min-overlap 0.9]
+Код возврата 1, если top-1 расходится или среднее пересечение top-k ниже порога.
+"""
+import sys
+import time
+import argparse
+import tempfile
+from typing import List
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from config import Config, BASE_DIR
+from services.embeddings_service import EmbeddingsService
+from utils.helpers import load_sample_questions
+
+
+def load_questions(limit: int = 30) -> List[str]:
+    return load_sample_questions(f"{BASE_DIR}/test_results.txt", Config.LOGS_FILE, limit)
+
+
+def build_service(backend: str, index_dir: str) -> EmbeddingsService:
+    service = EmbeddingsService(backend=backend, query_cache_size=0, query_cache_path=None)
+    service.build_indices(index_dir)
+    return service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Паритет поиска torch vs onnx")
+    parser.add_argument("--top-k", type=int, default=7)
+    parser.add_argument("--min-overlap", type=float, default=0.9)
+    args = parser.parse_args()
+
+    questions = load_questions()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        torch_service = build_service("torch", f"{tmp_dir}/torch")
+        onnx_service = build_service("onnx", f"{tmp_dir}/onnx")
+
+    rows = []
+    timings = {"torch": 0.0, "onnx": 0.0}
+    for question in questions:
+        ranked = {}
+        for name, service in (("torch", torch_service), ("onnx", onnx_service)):
+            start = time.perf_counter()
+            results = service.search(question, top_k=args.top_k)
+            timings[name] += time.perf_counter() - start
+            ranked[name] = [doc['id'] for doc, _ in results]
+        expected, actual = ranked["torch"], ranked["onnx"]
+        overlap = len(set(expected) & set(actual)) / max(len(expected), 1)
+        top1 = expected[:1] == actual[:1]
+        rows.append((question, top1, overlap, expected == actual))
+
+    print("\n" + "=" * 100)
+    for question, top1, overlap, exact in rows:
+        mark = "✅" if exact else ("🟡" if top1 else "❌")
+        print(f"{mark} top1={'да' if top1 else 'нет'} overlap={overlap:.2f} | {question}")
+
+    top1_rate = sum(r[1] for r in rows) / len(rows)
+    mean_overlap = sum(r[2] for r in rows) / len(rows)
+    exact_rate = sum(r[3] for r in rows) / len(rows)
+    print("=" * 100)
+    print(f"Вопросов: {len(rows)}, top-{args.top_k}")
+    print(f"Совпадение top-1: {top1_rate * 100:.1f}%")
+    print(f"Полное совпадение порядка: {exact_rate * 100:.1f}%")
+    print(f"Среднее пересечение top-k: {mean_overlap:.3f}")
+    for name, total in timings.items():
+        print(f"Среднее время поиска ({name}): {total / len(rows) * 1000:.1f} ms")
+
+    if top1_rate < 1.0 or mean_overlap < args.min_overlap:
+        print("❌ ONNX-бэкенд расходится с torch")
+        sys.exit(1)
+    print("✅ ONNX-бэкенд совпадает с torch")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Подбор порога кэша ответов на похожие вопросы (SEMANTIC_CACHE_THRESHOLD).
+
+Вопросы: группы перефразировок из data/chat_logs.txt (один смысл — одна группа)
+и остальные вопросы из test_results.txt и журнала чатов, каждый сам по себе.
+Для каждого порога вопросы по очереди проходят через SemanticAnswerCache так же,
+как в BotService._generate_answer: поиск top-7, ключ — первые 5 документов,
+промах кладет в кэш «ответ» с меткой группы.
+- попадание — кэш вернул ответ той же группы (LLM не вызывается зря);
+- ложное попадание — ответ другой группы (пользователь получил бы чужой ответ).
+
+Рекомендуемый порог — с наибольшей долей попаданий без ложных (при равной доле — более строгий).
+Выбранное значение записывается в config.py (SEMANTIC_CACHE_THRESHOLD) вместе
+с включением кэша (SEMANTIC_CACHE_SIZE > 0).
+
+Запуск: python check_semantic_cache.py [--thresholds 0.88 0.90 0.92 0.93 0.95 0.97] [--max-false-rate 0]
+Код возврата 1, если ни один порог не дает попаданий в пределах допустимой доли ложных.
+"""
+import sys
+import argparse
+from typing import Dict, List, Tuple
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from config import Config, BASE_DIR
+from services.embeddings_service import prepare_embeddings_service
+from services.semantic_cache_service import SemanticAnswerCache
+from utils.helpers import load_sample_questions
+
+# Перефразировки одного вопроса из журнала чатов (с опечатками пользователей)
+PARAPHRASES = [
+    ["Подскажи срок изготовления", "Срок изготовления индивидуальных стелек?",
+     "Сколько по времени изготавливаются индивидуальные стелкьи?"],
+    ["Есть оплата по ЕРИП?", "Ерип?", "Ерип есть?"],
+    ["какие способы оплаты?", "Система оплати?"],
+    ["Сколько стоит доставка товаров?", "Подскажи стоимость доставки"],
+    ["Хочу узнать адреса всех салонов", "Напиши пожалуйста адреса салонов"],
+    ["Номера салонов?", "А номера салонов?", "Номера телефонов"],
+    ["Гикало работает на выходных?", "работает на выходных? салон Гикало"],
+    ["Какие цены", "Какая цена индивидуальных стелек?"],
+]
+
+
+def _same_question_key(question: str) -> str:
+    # В журнале вопросы бывают с хвостовыми знаками («Есть оплата по ЕРИП?\»)
+    return question.lower().rstrip(' ?\\>')
+
+
+def load_questions() -> List[Tuple[str, str]]:
+    """Пары (вопрос, метка группы); вопросы вне PARAPHRASES — каждый своя группа"""
+    labeled = [(question, group[0]) for group in PARAPHRASES for question in group]
+    grouped = {_same_question_key(question) for question, _ in labeled}
+    for question in load_sample_questions(f"{BASE_DIR}/test_results.txt", Config.LOGS_FILE):
+        if _same_question_key(question) not in grouped:
+            labeled.append((question, question))
+    return labeled
+
+
+def replay(service, questions: List[Tuple[str, str]], threshold: float) -> Dict:
+    cache = SemanticAnswerCache(max_size=len(questions), threshold=threshold)
+    hits, false_hits = [], []
+    for question, label in questions:
+        results = service.search(question, top_k=7)
+        doc_ids = [doc['id'] for doc, _ in results[:5]]
+        embedding = service.encode_query(question)
+        answer = cache.get(embedding, doc_ids)
+        if answer is None:
+            cache.put(embedding, doc_ids, label, question)
+        elif answer == label:
+            hits.append(question)
+        else:
+            false_hits.append((question, answer))
+    return {'threshold': threshold, 'hits': hits, 'false_hits': false_hits}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Порог кэша ответов на похожие вопросы")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.88, 0.90, 0.92, 0.93, 0.95, 0.97])
+    parser.add_argument("--max-false-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    questions = load_questions()
+    # Сколько вопросов могли бы получить ответ из кэша: все, кроме первого в каждой группе
+    possible = sum(len(group) - 1 for group in PARAPHRASES)
+    service = prepare_embeddings_service()
+    rows = [replay(service, questions, threshold) for threshold in sorted(args.thresholds)]
+
+    print("\n" + "=" * 100)
+    print(f"📊 Вопросов: {len(questions)}, перефразировок, которые можно взять из кэша: {possible}")
+    print(f"{'Порог':>7} {'Попадания':>10} {'Доля':>7} {'Ложные':>7} {'Доля ложных':>12}")
+    best = None
+    for row in rows:
+        hit_rate = len(row['hits']) / max(possible, 1)
+        false_rate = len(row['false_hits']) / len(questions)
+        print(f"{row['threshold']:>7.3f} {len(row['hits']):>10} {hit_rate:>7.1%} "
+              f"{len(row['false_hits']):>7} {false_rate:>12.1%}")
+        for question, answer in row['false_hits']:
+            print(f"          ⚠️ {question!r} → ответ на {answer!r}")
+        if false_rate <= args.max_false_rate and (best is None or hit_rate >= best[1]):
+            best = (row['threshold'], hit_rate)
+    print("=" * 100)
+
+    if best is None or best[1] == 0:
+        print("❌ Ни один порог не дает попаданий без ложных — кэш оставить выключенным")
+        sys.exit(1)
+    print(f"✅ Рекомендуемый порог: SEMANTIC_CACHE_THRESHOLD={best[0]} (попаданий {best[1]:.1%})")
+
+
+if __name__ == '__main__':
+    main()
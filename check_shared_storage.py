@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка общего хранилища состояния (STORAGE_BACKEND=redis) для нескольких машин.
+
+Два экземпляра BotService работают с одним Redis — как две машины Fly во время
+rolling deploy, между которыми пользователь переключается посреди диалога:
+- поиск в салоне на первой машине, «еще» попеременно на второй и первой:
+  страницы идут подряд, без повторов и пропусков;
+- запись на прием: дата на первой машине, телефон на второй, имя снова на первой.
+
+По умолчанию Redis — fakeredis в памяти (pip install fakeredis); с --redis-url проверка
+идет на настоящем сервере (ключи под отдельным префиксом удаляются в конце).
+Таблица записей (Google Sheets) подменяется записью вызовов: проверяется только состояние бота.
+Без GROQ_API_KEY ответы о товарах строятся без LLM (запасной список) — на проверку это не влияет.
+
+Запуск: python check_shared_storage.py [--redis-url redis://localhost:6379/15] [--query "стельки гикало"]
+Код возврата 1, если состояние не пережило переход между экземплярами.
+"""
+import sys
+import argparse
+import types
+from typing import List
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from config import Config
+from services.bot_service import BotService
+from services.storage_backend import RedisBackend
+
+
+class RecordingAppointments:
+    """Запись на прием без Google Sheets: запоминает вызовы"""
+
+    def __init__(self):
+        self.calls: List[tuple] = []
+        self.sheets_service = types.SimpleNamespace(update_appointment_with_contacts=self._update)
+
+    def book_specific_slot(self, date: str, time: str, user_name: str, user_id: str, phone: str = "") -> str:
+        self.calls.append(('book', date, time, user_id))
+        return f"📅 {date} в {time} забронировано. 📱 Напишите номер телефона:"
+
+    def _update(self, date: str, time: str, user_id: str, name: str, phone: str) -> bool:
+        self.calls.append(('contacts', date, time, user_id, name, phone))
+        return True
+
+
+def make_bot(client, appointments: RecordingAppointments) -> BotService:
+    bot = BotService(redis_client=client)
+    bot._appointment_service = appointments
+    return bot
+
+
+def check_more_pagination(first: BotService, second: BotService, query: str) -> bool:
+    user_id = "check-more"
+    print(f"\n🔎 Поиск на первом экземпляре: {query}")
+    first.process_question(query, user_id)
+    context = second.context_service.get_user_context(user_id)
+    if not context:
+        print("❌ Второй экземпляр не видит контекст поиска")
+        return False
+    total = context['total']
+    print(f"📦 Найдено {total}, показано {context['cursor']}")
+
+    seen: List[str] = []
+    cursor = context['cursor']
+    for step, bot in enumerate([second, first, second]):
+        page = bot.context_service.get_more_products(user_id, count=5)
+        new_cursor = bot.context_service.get_user_context(user_id)['cursor']
+        ids = [product.id for product in page or []]
+        print(f"  «еще» на экземпляре {'B' if bot is second else 'A'}: {len(ids)} товаров, курсор {cursor} → {new_cursor}")
+        if new_cursor != min(cursor + 5, total) or len(ids) != new_cursor - cursor:
+            print("❌ Курсор сдвинулся неверно")
+            return False
+        if set(ids) & set(seen):
+            print("❌ Товары повторились между страницами")
+            return False
+        seen.extend(ids)
+        cursor = new_cursor
+    # Последний шаг — через обработчик сообщений, как в диалоге
+    reply = first.process_question("еще", user_id)
+    print(f"  «еще» через process_question: {reply[:80]!r}")
+    return True
+
+
+def check_booking_session(first: BotService, second: BotService, appointments: RecordingAppointments) -> bool:
+    user_id = "check-booking"
+    print("\n📅 Запись: дата на A, телефон на B, имя на A")
+    print("  A:", first.process_question("запишите меня на 20.11 в 10:00", user_id).splitlines()[0])
+    print("  B:", second.process_question("+375291234567", user_id).splitlines()[0])
+    print("  A:", first.process_question("Иван", user_id).splitlines()[0])
+    if len(appointments.calls) != 2 or appointments.calls[0][0] != 'book':
+        print(f"❌ Запись не дошла до бронирования и контактов: {appointments.calls}")
+        return False
+    _, date, time, _ = appointments.calls[0]
+    if appointments.calls[1] != ('contacts', date, time, user_id, 'Иван', '+375291234567'):
+        print(f"❌ Запись не завершена с данными из обоих экземпляров: {appointments.calls}")
+        return False
+    if user_id in first.user_sessions or user_id in second.user_sessions:
+        print("❌ Сессия не очищена после записи")
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Общее состояние двух экземпляров BotService в Redis")
+    parser.add_argument("--redis-url", help="настоящий Redis вместо fakeredis")
+    parser.add_argument("--query", default="стельки гикало")
+    args = parser.parse_args()
+
+    if args.redis_url:
+        import redis
+        client = redis.Redis.from_url(args.redis_url)
+        Config.REDIS_PREFIX = f"{Config.REDIS_PREFIX}check:"
+    else:
+        try:
+            import fakeredis
+        except ImportError:
+            print("❌ Нужен fakeredis (pip install fakeredis) или --redis-url")
+            sys.exit(1)
+        client = fakeredis.FakeRedis()
+
+    appointments = RecordingAppointments()
+    first = make_bot(client, appointments)
+    second = make_bot(client, appointments)
+    try:
+        ok = check_more_pagination(first, second, args.query)
+        ok = check_booking_session(first, second, appointments) and ok
+    finally:
+        if args.redis_url:
+            RedisBackend(client, Config.REDIS_PREFIX).clear()
+
+    print("\n✅ Состояние общее для экземпляров" if ok else "\n❌ Проверка не пройдена")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -35,6 +35,89 @@ class Config:
 
     # Настройки
     CACHE_TIMEOUT = 300
+    # Кэш ответов BotService: максимум записей, байт и период фоновой очистки просроченных (секунды)
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 5000))
+    CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    CACHE_SWEEP_INTERVAL = float(os.environ.get('CACHE_SWEEP_INTERVAL', 60))
+    # Общий (не зависящий от пользователя) уровень кэша: поиск по салонам и консультации.
+    # Ключ включает версию фида / базы знаний, поэтому записи можно держать дольше
+    SHARED_CACHE_TIMEOUT = int(os.environ.get('SHARED_CACHE_TIMEOUT', 1800))
+    SHARED_CACHE_MAX_ENTRIES = int(os.environ.get('SHARED_CACHE_MAX_ENTRIES', 2000))
+
+    # Бэкенд кодировщика: "torch" (fp32 SentenceTransformer) или "onnx" (int8, см. export_onnx.py)
+    EMBEDDINGS_BACKEND = os.environ.get('EMBEDDINGS_BACKEND', 'torch')
+    ONNX_MODEL_DIR = os.environ.get('ONNX_MODEL_DIR', os.path.join(
+        BASE_DIR, 'data', 'onnx', 'multilingual-e5-base'))
+
+    # Кэш эмбеддингов запросов (по умолчанию сохраняется на volume /data, если он смонтирован)
+    QUERY_CACHE_SIZE = int(os.environ.get('QUERY_CACHE_SIZE', 2048))
+    QUERY_CACHE_PATH = os.environ.get('QUERY_CACHE_PATH') or (
+        '/data/query_embeddings.npz' if os.path.isdir('/data') else None)
+
+    # Микро-батчинг кодирования запросов из параллельных вебхуков
+    ENCODER_MAX_BATCH_SIZE = int(os.environ.get('ENCODER_MAX_BATCH_SIZE', 16))
+    ENCODER_MAX_WAIT_MS = float(os.environ.get('ENCODER_MAX_WAIT_MS', 5))
+
+    # Сообщения, пришедшие во время прогрева индекса: размер очереди и сколько секунд ждать
+    PENDING_QUEUE_SIZE = int(os.environ.get('PENDING_QUEUE_SIZE', 100))
+    PENDING_QUEUE_TIMEOUT = float(os.environ.get('PENDING_QUEUE_TIMEOUT', 60))
+
+    # Фоновая обработка вебхуков: потоки, размер очереди, сколько id апдейтов помнить для дедупликации
+    WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', 4))
+    WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', 200))
+    WEBHOOK_DEDUP_SIZE = int(os.environ.get('WEBHOOK_DEDUP_SIZE', 10000))
+
+    # Исходящие запросы в Telegram и Bitrix24 (services/http_client.py): пул keep-alive
+    # соединений, таймауты (секунды), повторы на 429/5xx с паузой backoff * 2^n
+    HTTP_POOL_HOSTS = int(os.environ.get('HTTP_POOL_HOSTS', 4))
+    HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+    HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 15))
+    HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 3))
+    HTTP_RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', 0.5))
+    # Если сервер просит подождать дольше (retry_after), запрос не повторяется
+    HTTP_MAX_RETRY_DELAY = float(os.environ.get('HTTP_MAX_RETRY_DELAY', 30))
+
+    # Очередь исходящих сообщений (services/outbound_queue.py): потоки отправки, сколько частей
+    # сообщений держать в очереди, лимиты скорости (сообщений в секунду на канал и пауза между
+    # сообщениями одного чата), максимальная длина одного сообщения
+    OUTBOUND_WORKERS = int(os.environ.get('OUTBOUND_WORKERS', 4))
+    OUTBOUND_QUEUE_SIZE = int(os.environ.get('OUTBOUND_QUEUE_SIZE', 1000))
+    OUTBOUND_MAX_MESSAGE_LENGTH = int(os.environ.get('OUTBOUND_MAX_MESSAGE_LENGTH', 4096))
+    TELEGRAM_RATE_PER_SEC = float(os.environ.get('TELEGRAM_RATE_PER_SEC', 25))
+    TELEGRAM_CHAT_INTERVAL = float(os.environ.get('TELEGRAM_CHAT_INTERVAL', 1.0))
+    BITRIX_RATE_PER_SEC = float(os.environ.get('BITRIX_RATE_PER_SEC', 2))
+    BITRIX_CHAT_INTERVAL = float(os.environ.get('BITRIX_CHAT_INTERVAL', 0))
+
+    # Кэш ответов LLM (temperature=0): записей, время жизни в секундах, файл на volume /data
+    COMPLETION_CACHE_SIZE = int(os.environ.get('COMPLETION_CACHE_SIZE', 1000))
+    COMPLETION_CACHE_TTL = float(os.environ.get('COMPLETION_CACHE_TTL', 86400))
+    COMPLETION_CACHE_PATH = os.environ.get('COMPLETION_CACHE_PATH') or (
+        '/data/completion_cache.json' if os.path.isdir('/data') else None)
+    # Кэш ответов LLM на перефразированные вопросы: записей и порог косинусной близости
+    # эмбеддингов вопросов (ответ переиспользуется, только если совпал и набор документов).
+    # Выключен (0), пока порог не подобран check_semantic_cache.py на реальных вопросах
+    SEMANTIC_CACHE_SIZE = int(os.environ.get('SEMANTIC_CACHE_SIZE', 0))
+    SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', 0.93))
+
+    # Хранилище кэша ответов, контекстов «еще» и сессий записи: "memory" (в процессе)
+    # или "redis" (общее для всех машин, REDIS_URL); SESSION_TIMEOUT — время жизни сессии записи
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'memory')
+    REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    REDIS_PREFIX = os.environ.get('REDIS_PREFIX', 'ortos:')
+    SESSION_TIMEOUT = int(os.environ.get('SESSION_TIMEOUT', 3600))
+
+    # Общий процесс модели и поиска для нескольких HTTP-воркеров (gunicorn.conf.py).
+    # Если сокет не задан, каждый процесс держит свой EmbeddingsService
+    SEARCH_WORKER_SOCKET = os.environ.get('SEARCH_WORKER_SOCKET')
+    SEARCH_WORKER_READY_TIMEOUT = float(os.environ.get('SEARCH_WORKER_READY_TIMEOUT', 600))
+
+    # Прогрев фидов салонов при старте (BotService). Выключен: сообщения Telegram и Bitrix24
+    # обрабатывает EmbeddingsBotService, а BotService пока не подключен к обработчикам
+    FEED_WARMUP = os.environ.get('FEED_WARMUP', 'false').lower() == 'true'
+    # Пул прогрева: "thread" или "process"
+    FEED_WARMUP_EXECUTOR = os.environ.get('FEED_WARMUP_EXECUTOR', 'thread')
+    FEED_WARMUP_WORKERS = int(os.environ.get('FEED_WARMUP_WORKERS', 4))
 
     # Пути (для Railway)
     FEEDS_DIR = os.path.join(BASE_DIR, 'data/feeds')
@@ -100,3 +183,13 @@ class Config:
             else:
                 raise Exception(
                     "Google credentials not found. Set GOOGLE_CREDENTIALS_JSON environment variable")
+
+    @classmethod
+    def search_worker_authkey(cls) -> bytes:
+        """Ключ аутентификации канала к процессу поиска (hex в SEARCH_WORKER_AUTHKEY)"""
+        authkey = bytes.fromhex(os.environ.get('SEARCH_WORKER_AUTHKEY', '').strip())
+        if not authkey:
+            # С пустым ключом к сокету подключился бы любой локальный процесс
+            raise ValueError(
+                "SEARCH_WORKER_AUTHKEY не задан: сгенерируйте ключ (python -c \"import secrets; print(secrets.token_hex(32))\")")
+        return authkey
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Экспорт intfloat/multilingual-e5-base в ONNX с динамической int8-квантизацией.
+
+Результат (каталог Config.ONNX_MODEL_DIR):
+    model_int8.onnx       — квантованная модель (выход: last_hidden_state)
+    pooling_config.json   — режим пулинга и размерность из SentenceTransformer
+    tokenizer.*           — тот же токенизатор, что у SentenceTransformer
+
+Зависимости: pip install -r requirements-onnx.txt
+Запуск: python export_onnx.py [--out DIR] [--keep-fp32]
+Использование: EMBEDDINGS_BACKEND=onnx python app.py
+Проверка совпадения поиска с torch: python check_onnx_parity.py
+"""
+import os
+import sys
+import json
+import inspect
+import argparse
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from config import Config
+from services.encoder_backends import ONNX_MODEL_FILE, POOLING_CONFIG_FILE
+
+
+def pooling_mode(config: dict) -> str:
+    """Режим пулинга из конфига sentence-transformers (старый и новый формат)"""
+    if "pooling_mode" in config:
+        return config["pooling_mode"]
+    return "cls" if config.get("pooling_mode_cls_token") else "mean"
+
+
+def export(model_name: str, out_dir: str, cache_dir: str, keep_fp32: bool = False) -> None:
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"📥 Загружаем модель: {model_name}...")
+    st_model = SentenceTransformer(model_name, device="cpu", cache_folder=cache_dir)
+    transformer, pooling = st_model[0], st_model[1]
+    auto_model = transformer.auto_model.eval()
+    tokenizer = transformer.tokenizer
+
+    dummy = tokenizer(["query: пример запроса"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    fp32_path = os.path.join(out_dir, "model_fp32.onnx")
+    int8_path = os.path.join(out_dir, ONNX_MODEL_FILE)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    # Новые версии torch по умолчанию экспортируют через dynamo — нам нужен классический экспортер
+    export_kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs["dynamo"] = False
+
+    print("🔧 Экспорт в ONNX (fp32)...")
+    with torch.no_grad():
+        torch.onnx.export(
+            HiddenStates(auto_model),
+            tuple(dummy[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+            **export_kwargs,
+        )
+
+    print("🗜️ Динамическая int8-квантизация...")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    if not keep_fp32:
+        os.remove(fp32_path)
+
+    tokenizer.save_pretrained(out_dir)
+    pooling_config = {
+        "model_name": model_name,
+        "pooling_mode": pooling_mode(pooling.get_config_dict()),
+        "embedding_dimension": st_model.get_sentence_embedding_dimension(),
+        "max_seq_length": st_model.max_seq_length,
+    }
+    with open(os.path.join(out_dir, POOLING_CONFIG_FILE), 'w', encoding='utf-8') as f:
+        json.dump(pooling_config, f, ensure_ascii=False, indent=2)
+
+    size_mb = os.path.getsize(int8_path) / (1024 * 1024)
+    print(f"✅ Модель сохранена: {int8_path} ({size_mb:.0f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт e5 в ONNX int8")
+    parser.add_argument("--model", default="intfloat/multilingual-e5-base")
+    parser.add_argument("--out", default=Config.ONNX_MODEL_DIR)
+    parser.add_argument("--cache-dir", default=os.environ.get("HF_HOME", "/data/huggingface"))
+    parser.add_argument("--keep-fp32", action="store_true")
+    args = parser.parse_args()
+    export(args.model, args.out, args.cache_dir, args.keep_fp32)
+
+
+if __name__ == '__main__':
+    main()
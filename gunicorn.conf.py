@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Многопроцессный режим: gunicorn -c gunicorn.conf.py app:app
+
+Несколько HTTP-воркеров (WEB_CONCURRENCY) и один общий процесс модели и поиска
+(services/search_worker.py), к которому воркеры обращаются через unix-сокет.
+Модель (~1 GB) загружается один раз, сколько бы ни было воркеров.
+Однопроцессный режим (python app.py) по-прежнему работает без изменений.
+"""
+import os
+import sys
+import secrets
+import subprocess
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_class = "gthread"
+# Вебхуки ждут ответа LLM — дольше стандартных 30 секунд
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+# app импортируется до fork: воркеры делят страницы Flask и конфигурации
+preload_app = True
+
+SEARCH_SOCKET = os.environ.setdefault('SEARCH_WORKER_SOCKET', '/tmp/ortos-search.sock')
+os.environ.setdefault('SEARCH_WORKER_AUTHKEY', secrets.token_hex(32))
+
+_search_worker = None
+
+
+def on_starting(server):
+    """Запускает общий процесс поиска до старта HTTP-воркеров"""
+    global _search_worker
+    _search_worker = subprocess.Popen(
+        [sys.executable, '-m', 'services.search_worker', '--socket', SEARCH_SOCKET],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    server.log.info("Процесс поиска запущен: pid=%s, socket=%s", _search_worker.pid, SEARCH_SOCKET)
+
+
+def post_worker_init(worker):
+    """Каждый воркер сразу подключается к процессу поиска (ожидание — в фоне)"""
+    import app
+    app.start_background_initialization()
+
+
+def on_exit(server):
+    if _search_worker and _search_worker.poll() is None:
+        _search_worker.terminate()
+        _search_worker.wait(timeout=10)
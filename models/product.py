@@ -8,7 +8,20 @@ if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
 
-@dataclass
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def intern_params(params: Dict[str, str], pool: Optional[Dict[tuple, Dict[str, str]]] = None) -> Dict[str, str]:
+    """Интернирует ключи и значения params; с пулом одинаковые словари разделяются между товарами"""
+    params = {sys.intern(k): _intern(v) for k, v in params.items()}
+    if pool is None:
+        return params
+    return pool.setdefault(tuple(params.items()), params)
+
+
+# slots=True: без __dict__ на каждый товар — списки товаров живут в контекстах пользователей
+@dataclass(slots=True)
 class Product:
     id: str
     name: str
@@ -17,11 +30,17 @@ class Product:
     quantity: str
     category_id: str
     category_name: Optional[str] = None
+    # Словарь params может быть общим для одинаковых товаров фида — не изменяйте его на месте
     params: Dict = None
 
     def __post_init__(self):
         if self.params is None:
             self.params = {}
+        # Цены, количества и категории повторяются от товара к товару
+        self.price = _intern(self.price)
+        self.quantity = _intern(self.quantity)
+        self.category_id = _intern(self.category_id)
+        self.category_name = _intern(self.category_name)
 
     def get_size(self) -> str:
         return self.params.get('Размер', '')
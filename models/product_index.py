@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import sys
+from typing import Dict, Iterable, List, Optional, Set
+
+# Устанавливаем правильное кодирование для консоли Windows
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from models.product import Product
+
+
+class ProductIndex:
+    """
+    Инвертированный индекс товаров одного фида.
+    Идентификатор товара — его позиция в списке, поэтому выборка сохраняет исходный порядок.
+    """
+
+    def __init__(self, products: List[Product], brand_keys: Iterable[str] = ()):
+        self.products = products
+        self.all_ids: Set[int] = set(range(len(products)))
+        self.size_postings: Dict[str, Set[int]] = {}
+        self.brand_postings: Dict[str, Set[int]] = {}
+        self.category_postings: Dict[str, Set[int]] = {
+            'insoles': set(), 'footwear': set()}
+
+        brand_texts = []
+        for pos, product in enumerate(products):
+            for size_token in product.get_size().split():
+                self.size_postings.setdefault(size_token, set()).add(pos)
+            if product.is_insoles():
+                self.category_postings['insoles'].add(pos)
+            if product.is_footwear():
+                self.category_postings['footwear'].add(pos)
+            brand_texts.append(f"{product.name} {product.get_brand()}".lower())
+        self._brand_texts = brand_texts
+
+        for brand in brand_keys:
+            self._brand_ids(brand)
+
+    def ids_for_size(self, size: str) -> Set[int]:
+        return self.size_postings.get(size, set())
+
+    def ids_for_brands(self, brands: List[str]) -> Set[int]:
+        """Товары, подходящие хотя бы под один из брендов"""
+        ids: Set[int] = set()
+        for brand in brands:
+            ids |= self._brand_ids(brand)
+        return ids
+
+    def ids_for_category(self, category: str) -> Set[int]:
+        return self.category_postings.get(category, set())
+
+    def select(self, ids: Optional[Set[int]]) -> List[Product]:
+        """Товары по идентификаторам в порядке фида (None — все товары)"""
+        if ids is None:
+            return list(self.products)
+        return [self.products[pos] for pos in sorted(ids)]
+
+    def _brand_ids(self, brand: str) -> Set[int]:
+        # Та же подстрочная проверка, что и в Product.matches_brand; незнакомые бренды считаются один раз
+        key = brand.lower()
+        ids = self.brand_postings.get(key)
+        if ids is None:
+            ids = {pos for pos, text in enumerate(self._brand_texts) if key in text}
+            self.brand_postings[key] = ids
+        return ids
@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import requests
 import sys
 
 # Устанавливаем правильное кодирование для консоли Windows
@@ -7,6 +6,7 @@ if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
 from config import Config
+from services.http_client import outbound_client
 
 
 class BitrixChatService:
@@ -14,14 +14,14 @@ class BitrixChatService:
         self.webhook_url = Config.BITRIX_WEBHOOK_URL  # Вебхук бота
         self.bot_name = Config.BITRIX_BOT_NAME
         self.bot_code = Config.BITRIX_BOT_CODE
-        self.session = requests.Session()
+        # Общий пул соединений с app.py (keep-alive, таймауты, повторы на 429/5xx)
+        self.http = outbound_client
 
     def test_connection(self) -> bool:
         """Проверяет подключение к Битрикс24 через вебхук"""
         try:
             print(f"🔧 Тестируем подключение к: {self.webhook_url}")
-            response = self.session.post(
-                f"{self.webhook_url}/profile", timeout=10)
+            response = self.http.post(f"{self.webhook_url}/profile", retries=0)
             print(f"📡 Статус: {response.status_code}")
             if response.status_code == 200 and response.json().get('result'):
                 print("✅ Подключение успешно!")
@@ -38,8 +38,7 @@ class BitrixChatService:
         try:
             message_data = {"DIALOG_ID": dialog_id, "MESSAGE": message}
             print(f"📤 Отправляем сообщение в {dialog_id}: {message[:100]}...")
-            response = self.session.post(f"{self.webhook_url}/im.message.add",
-                                         json=message_data, timeout=10)
+            response = self.http.post(f"{self.webhook_url}/im.message.add", json=message_data)
             print(
                 f"📥 Ответ отправки: {response.status_code} - {response.text}")
             if response.status_code == 200 and response.json().get('result'):
@@ -5,24 +5,32 @@ import sys
 import time
 import threading
 from datetime import datetime
-from typing import List, Optional, Dict, Any, Tuple
+from typing import TYPE_CHECKING, Callable, List, Optional, Dict, Any, Tuple
 
 # Устанавливаем правильное кодирование для консоли Windows
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
-from groq import Groq
 from models.product import Product
 from config import Config
 from services.feed_service import FeedService
-from services.embeddings_service import EmbeddingsService
 from services.cache_service import CacheService
 from services.context_service import ContextService
 from services.filter_service import FilterService
 from services.search_service import SearchService
 from services.prompt_service import PromptService
 from services.consultation_service import ConsultationService
-from services.appointment_service import AppointmentService
+from services.pending_queue_service import PendingMessageQueue
+from services.completion_cache_service import CompletionCache
+from services.semantic_cache_service import SemanticAnswerCache
+from services.storage_backend import MemoryBackend, StoredMapping, create_backend
+
+# groq, faiss/torch и gspread импортируются при первом использовании:
+# импорт этого модуля не должен задерживать старт Flask и ответ /health
+if TYPE_CHECKING:
+    from groq import Groq
+    from services.embeddings_service import EmbeddingsService
+    from services.appointment_service import AppointmentService
 
 
 def handle_greeting(question: str) -> Optional[str]:
@@ -43,19 +51,62 @@ def handle_greeting(question: str) -> Optional[str]:
 
 
 class BotService:
-    def __init__(self):
-        self.client = Groq(api_key=Config.GROQ_API_KEY)
+    def __init__(self, redis_client=None):
+        """
+        redis_client — клиент Redis для кэша, контекстов и сессий (например, fakeredis в проверках);
+        без него хранилище выбирается по Config.STORAGE_BACKEND
+        """
+        self._client: Optional["Groq"] = None
+        self._appointment_service: Optional["AppointmentService"] = None
+        self._lazy_lock = threading.Lock()
         self.feed_service = FeedService()
-        self.cache_service = CacheService(Config.CACHE_TIMEOUT)
-        self.context_service = ContextService(Config.CACHE_TIMEOUT)
+        # Личный кэш: ответы о записи зависят от пользователя (его записи), но не меняют сессию
+        self.cache_service = CacheService(
+            Config.CACHE_TIMEOUT, Config.CACHE_MAX_ENTRIES,
+            Config.CACHE_MAX_BYTES, Config.CACHE_SWEEP_INTERVAL,
+            backend=create_backend('cache', redis_client))
+        # Общий для всех пользователей кэш: поиск по салону и консультации зависят только
+        # от вопроса и версии данных (фида / базы знаний), но не от того, кто спрашивает
+        self.shared_cache = CacheService(
+            Config.SHARED_CACHE_TIMEOUT, Config.SHARED_CACHE_MAX_ENTRIES,
+            Config.CACHE_MAX_BYTES, Config.CACHE_SWEEP_INTERVAL,
+            backend=create_backend('shared', redis_client))
+        self.quick_answer_hits = 0
         self.filter_service = FilterService()
         self.search_service = SearchService(
             self.feed_service, self.filter_service)
+        self.context_service = ContextService(
+            Config.CACHE_TIMEOUT, self.feed_service,
+            backend=create_backend('context', redis_client),
+            result_backend=create_backend('results', redis_client),
+            search=self.search_service.search_in_salon,
+            result_timeout=Config.SHARED_CACHE_TIMEOUT)
         self.prompt_service = PromptService()
         self.consultation_service = ConsultationService()
-        self.appointment_service = AppointmentService()
         self.quick_answers = Config.QUICK_ANSWERS
-        self.user_sessions = {}  # Для хранения временных данных пользователей
+        # Для хранения временных данных пользователей (сбор телефона и имени при записи)
+        self.user_sessions = StoredMapping(
+            create_backend('session', redis_client) or MemoryBackend(), Config.SESSION_TIMEOUT)
+
+    @property
+    def client(self) -> "Groq":
+        """Groq-клиент создается при первом обращении к LLM"""
+        if self._client is None:
+            with self._lazy_lock:
+                if self._client is None:
+                    from groq import Groq
+                    self._client = Groq(api_key=Config.GROQ_API_KEY)
+        return self._client
+
+    @property
+    def appointment_service(self) -> "AppointmentService":
+        """Запись на прием (авторизация в Google Sheets) — только когда она действительно нужна"""
+        if self._appointment_service is None:
+            with self._lazy_lock:
+                if self._appointment_service is None:
+                    from services.appointment_service import AppointmentService
+                    self._appointment_service = AppointmentService()
+        return self._appointment_service
 
 
 
@@ -79,52 +130,77 @@ class BotService:
             print("🔄 Обрабатываем запрос 'еще'")
             return self._handle_more_request(user_id)
 
-        # 4. Кэш
-        cache_key = f"bot:{user_id}:{question_clean}"
-        cached_response = self.cache_service.get(cache_key)
-        if cached_response:
-            return cached_response
-
-        # 5. Поиск по салонам (ПОВЫШАЕМ ПРИОРИТЕТ!)
+        # 4. Поиск по салонам (ПОВЫШАЕМ ПРИОРИТЕТ!) — общий кэш по версии фида
         salon_name, feed_file = self.feed_service.detect_salon(question)
         if salon_name and feed_file:
             print(f"🏪 Найден салон {salon_name}, ищем товары...")
-            result = self._search_in_salon(
+            return self._search_in_salon(
                 question, salon_name, feed_file, user_id)
-            self.cache_service.set(cache_key, result)
-            return result
 
-        # 6. Быстрые ответы (ПОНИЖАЕМ ПРИОРИТЕТ - после поиска товаров)
+        # 5. Быстрые ответы (ПОНИЖАЕМ ПРИОРИТЕТ - после поиска товаров)
         quick_answer = self._get_quick_answer(question_clean)
         if quick_answer:
             print(f"🎯 Используем быстрый ответ для: {question_clean}")
+            self.quick_answer_hits += 1
             return quick_answer
 
-        # 7. Запросы на запись
+        # 6. Команды записи (отмена, просмотр, бронирование) — не кэшируются: ответы меняют
+        # сессию пользователя («отмена» ждет телефон) и записи в таблице
         appointment_result = self._handle_appointment_requests(
             question, question_clean, user_id)
         if appointment_result:
-            self.cache_service.set(cache_key, appointment_result)
             return appointment_result
 
-        # 8. Консультации (RAG)
-        result = self.consultation_service.get_consultation_response(
-            question, self.client, self.data)
-        self.cache_service.set(cache_key, result)
-        return result
+        # 7. Свободные даты и общие вопросы о записи — сессию не меняют, кэш личный
+        if self._is_availability_request(question_clean):
+            cache_key = f"bot:{user_id}:{question_clean}"
+            cached_response = self.cache_service.get(cache_key)
+            if cached_response:
+                return cached_response
+            print(f"📅 Обрабатываем запрос на запись: {question}")
+            result = self.appointment_service.process_appointment_request(question, "Пользователь", user_id)
+            if result:
+                self.cache_service.set(cache_key, result)
+                return result
+
+        # 8. Консультации (RAG) — общий кэш по версии базы знаний
+        shared_key = self._shared_key('consult', self._kb_version(), question_clean)
+        cached_response = self.shared_cache.get(shared_key)
+        if cached_response:
+            return cached_response
 
-        # 9. Общая консультация
-        result = self._get_general_consultation(question)
-        self.cache_service.set(cache_key, result)
+        result, final = self.consultation_service.consult(question, self.client)
+        if final:
+            # Запасной ответ после сбоя Groq всем пользователям не раздаем
+            self.shared_cache.set(shared_key, result)
         return result
 
+    @staticmethod
+    def _shared_key(kind: str, version: str, question_clean: str) -> str:
+        return f"shared:{kind}:{version}:{' '.join(question_clean.split())}"
+
+    def _kb_version(self) -> str:
+        """Версия базы знаний консультаций: меняется вместе с файлом stelki.txt"""
+        try:
+            stat = os.stat(Config.STELKI_FILE)
+        except OSError:
+            return "missing"
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Попадания по уровням кэша: общий, личный и быстрые ответы"""
+        return {
+            'shared': self.shared_cache.get_stats(),
+            'user': self.cache_service.get_stats(),
+            'quick_answers': {'hits': self.quick_answer_hits},
+        }
+
     def _handle_user_session(self, question: str, user_id: str) -> Optional[str]:
         """Обрабатывает сбор дополнительных данных пользователя"""
-        if user_id not in self.user_sessions:
+        session = self.user_sessions.get(user_id)
+        if session is None:
             return None
 
-        session = self.user_sessions[user_id]
-
         # Обрабатываем отмену записи
         if session.get('awaiting_cancel_phone'):
             phone = self._extract_phone(question)
@@ -150,6 +226,7 @@ class BotService:
                 session['phone'] = phone
                 session['awaiting_phone'] = False
                 session['awaiting_name'] = True
+                self.user_sessions[user_id] = session
                 return "📞 Телефон сохранен! 👤 Как к вам обращаться?"
             else:
                 return "📱 Пожалуйста, введите корректный номер телефона (например: +375291234567 или 291234567)"
@@ -159,6 +236,7 @@ class BotService:
             name = question.strip()
             if len(name) > 1:
                 session['name'] = name
+                self.user_sessions[user_id] = session
                 # Завершаем запись с собранными данными
                 result = self._complete_booking(user_id)
                 del self.user_sessions[user_id]  # Очищаем сессию
@@ -292,27 +370,24 @@ class BotService:
                 }
                 return self.appointment_service.book_specific_slot(date, time, "Пользователь", user_id)
 
-        # 6. Проверяем общие запросы на запись
-        appointment_keywords = ['записаться', 'запись', 'свободные даты']
+        print("❌ Не найдено подходящих команд записи")
+        return None
 
+    def _is_availability_request(self, question_clean: str) -> bool:
+        """Общий запрос на запись или проверка свободной даты (только чтение расписания)"""
+        # Общие запросы на запись
+        appointment_keywords = ['записаться', 'запись', 'свободные даты']
         if any(keyword in question_clean for keyword in appointment_keywords):
-            print(f"📅 Обрабатываем общий запрос на запись: {question}")
-            return self.appointment_service.process_appointment_request(question, "Пользователь", user_id)
+            return True
 
-        # 7. Проверяем запросы на доступность конкретной даты
+        # Запросы на доступность конкретной даты
         date_patterns = [
             r'(\d{1,2})\s+(январ[ья]|феврал[ья]|март[а]?|апрел[ья]|ма[йя]|июн[ья]|июл[ья]|август[а]?|сентябр[ья]|октябр[ья]|ноябр[ья]|декабр[ья])',
             r'(\d{1,2})\.(\d{1,2})',
             r'(\d{1,2})\.(\d{1,2})\.(\d{4})'
         ]
 
-        for pattern in date_patterns:
-            if re.search(pattern, question_clean):
-                print(f"📅 Проверяем доступность даты: {question}")
-                return self.appointment_service.process_appointment_request(question, "Пользователь", user_id)
-
-        print("❌ Не найдено подходящих паттернов для записи")
-        return None
+        return any(re.search(pattern, question_clean) for pattern in date_patterns)
 
     def _handle_more_request(self, user_id: str) -> str:
         """Обработка запроса 'еще' - показываем следующие товары"""
@@ -345,22 +420,48 @@ class BotService:
             return self._format_products_fallback(more_products, "Дополнительные товары:")
 
     def _search_in_salon(self, question: str, salon_name: str, feed_file: str, user_id: str) -> str:
-        """Поиск товаров в фиде салона"""
+        """
+        Поиск товаров в фиде салона. Ответ и найденные товары кэшируются для всех
+        пользователей; при попадании пользователю только выставляется контекст для «еще».
+        """
+        catalog = self.feed_service.get_catalog(feed_file)
+        shared_key = None
+        if catalog is not None:
+            shared_key = self._shared_key('salon', catalog.version, question.lower().strip())
+            cached = self.shared_cache.get(shared_key)
+            if cached is not None:
+                result, total = cached
+                if total:
+                    self.context_service.set_search_context(
+                        user_id, salon_name, feed_file, catalog.version, question, total, min(10, total))
+                return result
+
         filtered_products = self.search_service.search_in_salon(
             question, salon_name, feed_file)
 
+        generated = True
         if not filtered_products:
-            return f"В салоне {salon_name} не найдено товаров по вашему запросу."
-
-        shown_products = filtered_products[:10]
-        self.context_service.set_search_context(
-            user_id, salon_name, question, filtered_products, shown_products
-        )
+            result = f"В салоне {salon_name} не найдено товаров по вашему запросу."
+        else:
+            shown_products = filtered_products[:10]
+            if catalog is not None:
+                self.context_service.store_result_set(
+                    catalog.version, question, [product.id for product in filtered_products])
+                self.context_service.set_search_context(
+                    user_id, salon_name, feed_file, catalog.version, question,
+                    len(filtered_products), len(shown_products)
+                )
+            result, generated = self._create_search_response(
+                question, shown_products, salon_name, len(filtered_products))
 
-        return self._create_search_response(question, shown_products, salon_name, len(filtered_products))
+        if shared_key is not None and generated:
+            # Список найденных товаров хранит ContextService (result_sets), здесь — только их число
+            self.shared_cache.set(shared_key, [result, len(filtered_products)])
+        return result
 
-    def _create_search_response(self, question: str, products: List[Product], salon_name: str, total_products: int) -> str:
-        """Создаем ответ для поиска товаров"""
+    def _create_search_response(self, question: str, products: List[Product], salon_name: str,
+                                total_products: int) -> Tuple[str, bool]:
+        """Создаем ответ для поиска товаров; второе значение — False, если ответ без AI (fallback)"""
         prompt = self.prompt_service.create_search_prompt(
             question, products, salon_name, total_products)
 
@@ -383,11 +484,11 @@ class BotService:
 
             result = response.choices[0].message.content
             print(f"✅ Результат поиска получен")
-            return result
+            return result, bool(result)
 
         except Exception as e:
             print(f"❌ Ошибка поиска: {str(e)}")
-            return self._format_products_fallback(products, f"Товары в салоне {salon_name}:")
+            return self._format_products_fallback(products, f"Товары в салоне {salon_name}:"), False
 
     def _format_products_fallback(self, products: List[Product], title: str) -> str:
         """Форматирование товаров без AI (fallback)"""
@@ -459,49 +560,57 @@ class BotService:
 
 
 
+STARTING_REPLY = "🔄 Бот запускается, попробуйте еще раз через минуту."
+
+
 class EmbeddingsBotService:
     def __init__(self):
         self._init_lock = threading.Lock()
         self._initializing = False
-        self.embeddings_service: Optional[EmbeddingsService] = None
-        self.client: Optional[Groq] = None
+        # Выставляется по окончании инициализации (успешной или нет)
+        self.ready_event = threading.Event()
+        self.embeddings_service: Optional["EmbeddingsService"] = None
+        self.client: Optional["Groq"] = None
+        self.pending_queue = PendingMessageQueue(
+            self.process_question,
+            self.ready_event,
+            max_size=Config.PENDING_QUEUE_SIZE,
+            timeout=Config.PENDING_QUEUE_TIMEOUT,
+            fallback=STARTING_REPLY,
+        )
+        self.completion_cache = CompletionCache(
+            max_size=Config.COMPLETION_CACHE_SIZE,
+            ttl=Config.COMPLETION_CACHE_TTL,
+            persist_path=Config.COMPLETION_CACHE_PATH,
+        )
+        self.semantic_cache = SemanticAnswerCache(
+            max_size=Config.SEMANTIC_CACHE_SIZE,
+            threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+        )
         self._ensure_initialized()
 
+    def is_ready(self) -> bool:
+        return self.embeddings_service is not None
+
     def _initialize_embeddings(self):
         print("⚙️ Инициализация EmbeddingsBotService...")
         init_start = time.perf_counter()
         service = None
         client = None
         try:
-            service = EmbeddingsService()
-            print("✅ EmbeddingsService создан")
-            stats = service.get_stats()
-            print(f"📊 Embeddings scope: docs={stats['total_documents']}, sections={stats['total_sections']}, locations={stats['total_locations']}, dim={stats['embedding_dim']}")
-            loaded = False
-            try:
-                load_flag_start = time.perf_counter()
-                loaded = service.load_indices()
-                load_flag_elapsed = time.perf_counter() - load_flag_start
-                print(f"📦 Попытка загрузки индексов завершена за {load_flag_elapsed:.2f}s: {loaded}")
-                if loaded:
-                    stats_after_load = service.get_stats()
-                    print(f"📦 Загруженные индексы: docs={stats_after_load['total_documents']}, semantic={stats_after_load['has_semantic_index']}, bm25={stats_after_load['has_bm25_index']}")
-            except Exception as e:
-                print(f"❌ Ошибка загрузки индексов: {e}")
-            if not loaded:
-                try:
-                    print("🔨 Строим индексы...")
-                    build_cycle_start = time.perf_counter()
-                    service.build_indices()
-                    stats_after_build = service.get_stats()
-                    print(f"🆕 Построенные индексы: docs={stats_after_build['total_documents']}, semantic={stats_after_build['has_semantic_index']}, bm25={stats_after_build['has_bm25_index']}")
-                    service.save_indices()
-                    build_cycle_elapsed = time.perf_counter() - build_cycle_start
-                    print(f"✅ Индексы созданы и сохранены за {build_cycle_elapsed:.2f}s")
-                except Exception as e:
-                    print(f"❌ Ошибка создания индексов: {e}")
+            if Config.SEARCH_WORKER_SOCKET:
+                # Модель и индексы живут в общем процессе поиска (gunicorn.conf.py)
+                from services.search_worker import RemoteEmbeddingsService
+                remote = RemoteEmbeddingsService(
+                    Config.SEARCH_WORKER_SOCKET, Config.search_worker_authkey())
+                remote.wait_ready(Config.SEARCH_WORKER_READY_TIMEOUT)
+                service = remote
+            else:
+                from services.embeddings_service import prepare_embeddings_service
+                service = prepare_embeddings_service()
             if Config.GROQ_API_KEY:
                 try:
+                    from groq import Groq
                     client = Groq(api_key=Config.GROQ_API_KEY)
                     print("✅ Groq клиент инициализирован")
                 except Exception as e:
@@ -512,11 +621,14 @@ class EmbeddingsBotService:
             elapsed = time.perf_counter() - init_start
             with self._init_lock:
                 if service and not self.embeddings_service:
+                    self.completion_cache.set_kb_version(service.kb_version)
+                    self.semantic_cache.set_kb_version(service.kb_version)
                     self.embeddings_service = service
                     print("✅ EmbeddingsService активирован")
                 if client:
                     self.client = client
                 self._initializing = False
+                self.ready_event.set()
                 print(f"⚙️ Инициализация EmbeddingsBotService завершена за {elapsed:.2f}s")
 
     def _ensure_initialized(self) -> bool:
@@ -528,10 +640,18 @@ class EmbeddingsBotService:
             if self._initializing:
                 return False
             self._initializing = True
+            self.ready_event.clear()
             threading.Thread(target=self._initialize_embeddings, daemon=True).start()
         return False
 
-    def process_question(self, question: str, user_id: str = "telegram") -> str:
+    def process_question(self, question: str, user_id: str = "telegram",
+                         reply: Optional[Callable[[str], None]] = None,
+                         timings: Optional[Dict[str, float]] = None) -> Optional[str]:
+        """
+        Ответ на вопрос. Если индекс еще прогревается и передан reply, вопрос ставится
+        в очередь ожидания и возвращается None — ответ позже уйдет через reply.
+        В timings (если передан) записывается время этапов search и llm.
+        """
         print(f"📝 [EmbeddingsBotService] Получен вопрос от {user_id}: {question}")
         
         greeting_response = handle_greeting(question)
@@ -540,8 +660,11 @@ class EmbeddingsBotService:
             return greeting_response
         
         if not self._ensure_initialized():
+            if reply is not None and self.pending_queue.submit(question, user_id, reply):
+                print(f"⏳ EmbeddingsService еще инициализируется, вопрос в очереди ({len(self.pending_queue)})")
+                return None
             print("⏳ EmbeddingsService еще инициализируется")
-            return "🔄 Бот запускается, попробуйте еще раз через минуту."
+            return STARTING_REPLY
         query = question.strip()
         if not query:
             return "Пожалуйста, напишите вопрос."
@@ -549,7 +672,10 @@ class EmbeddingsBotService:
             print("⚠️ EmbeddingsService недоступен")
             return "Сервис поиска временно недоступен."
         try:
+            search_start = time.perf_counter()
             results = self.embeddings_service.search(query, top_k=7)
+            if timings is not None:
+                timings['search'] = time.perf_counter() - search_start
             print(f"🔍 Найдено результатов: {len(results)}")
             if results:
                 for doc, score in results:
@@ -563,7 +689,10 @@ class EmbeddingsBotService:
         if not results:
             print("⚠️ Поиск не вернул результатов")
             return "Информация не найдена. Уточните вопрос."
+        llm_start = time.perf_counter()
         answer = self._generate_answer(query, results)
+        if timings is not None:
+            timings['llm'] = time.perf_counter() - llm_start
         if answer:
             answer_preview = answer if len(answer) <= 400 else answer[:400] + "..."
             print(f"🗣️ Ответ AI: {answer_preview}")
@@ -620,6 +749,21 @@ class EmbeddingsBotService:
 {context}
 
 Дай точный краткий ответ БЕЗ повторения вопроса. Максимум 2-3 предложения."""
+        doc_ids = [doc['id'] for doc, _ in results[:5]]
+        cache_key = CompletionCache.make_key(
+            Config.CONSULT_MODEL, system_prompt, question,
+            doc_ids, max_tokens=400, temperature=0.0)
+        cached_answer = self.completion_cache.get(cache_key)
+        if cached_answer is not None:
+            print("♻️ Ответ LLM из кэша")
+            return cached_answer
+        query_embedding = self._query_embedding(question) if self.semantic_cache.enabled else None
+        if query_embedding is not None:
+            similar_answer = self.semantic_cache.get(query_embedding, doc_ids)
+            if similar_answer is not None:
+                print("♻️ Ответ LLM на похожий вопрос из кэша")
+                self.completion_cache.put(cache_key, similar_answer)
+                return similar_answer
         try:
             response = self.client.chat.completions.create(
                 model=Config.CONSULT_MODEL,
@@ -630,11 +774,23 @@ class EmbeddingsBotService:
                 max_tokens=400,
                 temperature=0.0
             )
-            return response.choices[0].message.content
+            answer = response.choices[0].message.content
+            self.completion_cache.put(cache_key, answer)
+            if query_embedding is not None:
+                self.semantic_cache.put(query_embedding, doc_ids, answer, question)
+            return answer
         except Exception as e:
             print(f"❌ Ошибка Groq: {e}")
             return ""
 
+    def _query_embedding(self, question: str):
+        """Эмбеддинг вопроса, уже посчитанный поиском (берется из кэша эмбеддингов запросов)"""
+        try:
+            return self.embeddings_service.encode_query(question)
+        except Exception as e:
+            print(f"⚠️ Не удалось получить эмбеддинг вопроса: {e}")
+            return None
+
     def _format_results(self, results: List[Tuple[Dict[str, Any], float]]) -> str:
         if not results:
             return ""
@@ -1,42 +1,204 @@
 # -*- coding: utf-8 -*-
-import time
 import sys
-from typing import Any, Optional, Tuple
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
 # Устанавливаем правильное кодирование для консоли Windows
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
 
+def _sizeof(key: str, value: Any) -> int:
+    """
+    Приблизительный размер записи в байтах: объект плюс строки, на которые он ссылается
+    напрямую (ответы бота и LLM — строки). Без сериализации — set вызывается на каждый ответ
+    """
+    size = sys.getsizeof(key) + sys.getsizeof(value)
+    if isinstance(value, dict):
+        value = [*value.keys(), *value.values()]
+    if isinstance(value, (list, tuple)):
+        size += sum(len(item) for item in value if isinstance(item, (str, bytes)))
+    return size
+
+
 class CacheService:
-    def __init__(self, timeout: int = 300):
-        self.cache = {}
+    """
+    Потокобезопасный LRU-кэш с временем жизни записей.
+    Размер ограничен числом записей и суммарным объемом; просроченные записи удаляет
+    фоновый поток раз в sweep_interval секунд, а не только повторное чтение того же ключа.
+
+    С backend (RedisBackend из services.storage_backend) записи хранятся вне процесса
+    и общие для всех машин: время жизни ставит Redis, вытеснение — его maxmemory-policy.
+    """
+
+    def __init__(self, timeout: int = 300, max_entries: int = 5000,
+                 max_bytes: int = 32 * 1024 * 1024, sweep_interval: float = 60.0,
+                 backend=None):
         self.timeout = timeout
+        self.backend = backend
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        # ключ → (время записи, значение, размер); порядок — от давно использованных к свежим
+        self.cache: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
 
     def get(self, key: str) -> Optional[Any]:
-        if key in self.cache:
-            cache_time, cached_response = self.cache[key]
-            if time.time() - cache_time < self.timeout:
-                print(f"♻️ Используем кэшированный ответ для: {key}")
-                return cached_response
-            else:
-                # Удаляем просроченный кэш
-                del self.cache[key]
-        return None
-
-    def set(self, key: str, value: Any) -> None:
-        self.cache[key] = (time.time(), value)
-        print(f"💾 Сохраняем в кэш: {key}")
+        if self.backend is not None:
+            value = self.backend.get(key)
+            with self._lock:
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return value
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.time() - entry[0] >= self.timeout:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any, created_at: Optional[float] = None,
+            size: Optional[int] = None) -> None:
+        """
+        created_at — время записи (time.time()), если значение восстановлено с диска;
+        size — размер записи, если вызывающий знает его лучше оценки _sizeof
+        (например, значение ссылается на объекты, которые и так живут в другом кэше)
+        """
+        if self.backend is not None:
+            self.backend.set(key, value, self.timeout)
+            return
+        size = size if size is not None else _sizeof(key, value)
+        if size > self.max_bytes or self.max_entries <= 0:
+            # Значение не помещается — старое тоже удаляем, иначе get вернул бы устаревший ответ
+            self.delete(key)
+            return
+        self._ensure_sweeper()
+        with self._lock:
+            if key in self.cache:
+                self._remove(key)
+            self.cache[key] = (created_at if created_at is not None else time.time(), value, size)
+            self.bytes += size
+            while len(self.cache) > self.max_entries or self.bytes > self.max_bytes:
+                oldest = next(iter(self.cache))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        if self.backend is not None:
+            self.backend.delete(key)
+            return
+        with self._lock:
+            if key in self.cache:
+                self._remove(key)
 
     def clear(self) -> None:
-        self.cache.clear()
+        if self.backend is not None:
+            self.backend.clear()
+        with self._lock:
+            self.cache.clear()
+            self.bytes = 0
         print("🧹 Очищаем кэш")
 
+    def items(self) -> List[Tuple[str, float, Any]]:
+        """Снимок непросроченных записей (ключ, время записи, значение) в порядке LRU"""
+        if self.backend is not None:
+            # Время записи в Redis не хранится (срок жизни ставит сам Redis), а снимок
+            # общего кэша нужен только для сохранения локального на диск
+            raise NotImplementedError("items() недоступен для кэша с backend")
+        now = time.time()
+        with self._lock:
+            return [(key, created, value) for key, (created, value, _) in self.cache.items()
+                    if now - created < self.timeout]
+
+    def __len__(self) -> int:
+        return self.backend.count() if self.backend is not None else len(self.cache)
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self.cache.pop(key)
+        self.bytes -= size
+
     def remove_short_queries(self) -> None:
         """Удаляем кэш для коротких запросов"""
-        short_keys = [k for k in self.cache.keys() if any(
-            word in k for word in ['еще', 'другие', '?'])]
-        for key in short_keys:
-            del self.cache[key]
+        if self.backend is not None:
+            short_keys = [k for k in self.backend.keys() if any(
+                word in k for word in ['еще', 'другие', '?'])]
+            self.backend.delete(*short_keys)
+            if short_keys:
+                print(f"🗑️ Удаляем кэш для коротких запросов: {len(short_keys)}")
+            return
+        with self._lock:
+            short_keys = [k for k in self.cache.keys() if any(
+                word in k for word in ['еще', 'другие', '?'])]
+            for key in short_keys:
+                self._remove(key)
         if short_keys:
             print(f"🗑️ Удаляем кэш для коротких запросов: {len(short_keys)}")
+
+    def sweep(self) -> int:
+        """Удаляет просроченные записи; возвращает их число"""
+        now = time.time()
+        with self._lock:
+            # Записи идут примерно по времени записи, но get переставляет их в конец,
+            # поэтому проверяем все — под локом это один проход по словарю
+            expired = [key for key, (created, _, _) in self.cache.items() if now - created >= self.timeout]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def _ensure_sweeper(self) -> None:
+        # Поток стартует при первой записи: после fork (gunicorn preload_app) — уже в воркере
+        if self._sweeper is not None or self.sweep_interval <= 0:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="cache-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while not self._stop.wait(self.sweep_interval):
+            self.sweep()
+
+    def close(self) -> None:
+        """Останавливает фоновую очистку"""
+        self._stop.set()
+
+    def get_stats(self) -> Dict:
+        total = self.hits + self.misses
+        stats = {
+            'backend': type(self.backend).__name__ if self.backend is not None else 'memory',
+            'size': len(self),
+            'timeout': self.timeout,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+        if self.backend is None:
+            # Объем, лимиты и вытеснение с backend считает Redis, локальные счетчики не используются
+            stats.update({
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            })
+        return stats
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+# Устанавливаем правильное кодирование для консоли Windows
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from models.product import Product
+from models.product_index import ProductIndex
+from services.feed_service import FeedService
+from services.filter_service import FilterService
+
+
+def _parse_feed_file(feed_path: str) -> List[Product]:
+    """Парсинг фида в отдельном процессе (функция должна быть на уровне модуля для pickle)"""
+    return FeedService().load_products(feed_path)
+
+
+@dataclass
+class MultiSalonCatalog:
+    # Каждый товар хранится один раз (экземпляр из фида первого салона, где он встретился),
+    # позиция в списке — его идентификатор в индексе; остатки по салонам — в availability
+    products: List[Product] = field(default_factory=list)
+    # id товара -> {салон: количество}
+    availability: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    # салон -> позиции товаров в порядке фида салона
+    salon_positions: Dict[str, List[int]] = field(default_factory=dict)
+    # файл фида -> версия (хэш содержимого), по которой собран каталог
+    versions: Dict[str, str] = field(default_factory=dict)
+    index: Optional[ProductIndex] = None
+
+    def get_quantity(self, product_id: str, salon_name: str) -> Optional[str]:
+        return self.availability.get(product_id, {}).get(salon_name)
+
+
+class CatalogService:
+    """
+    Объединенный каталог всех салонов: один фильтр вместо прохода по 14 фидам.
+    """
+
+    def __init__(self, feed_service: FeedService, filter_service: FilterService):
+        self.feed_service = feed_service
+        self.filter_service = filter_service
+        self._catalog: Optional[MultiSalonCatalog] = None
+        self._lock = threading.Lock()
+
+    def warm_up(self, executor: str = "thread", max_workers: Optional[int] = None) -> MultiSalonCatalog:
+        """Параллельно парсит фиды всех салонов и собирает объединенный каталог.
+
+        executor: "thread" — парсинг в пуле потоков, "process" — XML разбирается в пуле процессов
+        (кэш и проверка версий фидов остаются в текущем процессе).
+        """
+        print(f"🔥 Прогрев каталога салонов ({executor}, workers={max_workers or 'auto'})...")
+        warm_start = time.perf_counter()
+        feed_files = list(self.feed_service.salons.values())
+
+        process_pool = ProcessPoolExecutor(max_workers=max_workers) if executor == "process" else None
+        try:
+            parser = None
+            if process_pool:
+                def parser(feed_path: str) -> List[Product]:
+                    return process_pool.submit(_parse_feed_file, feed_path).result()
+
+            with ThreadPoolExecutor(max_workers=max_workers or len(feed_files)) as pool:
+                list(pool.map(lambda feed_file: self.feed_service.get_catalog(feed_file, parser), feed_files))
+        finally:
+            if process_pool:
+                process_pool.shutdown()
+
+        catalog = self.get_catalog()
+        print(f"✅ Каталог прогрет за {time.perf_counter() - warm_start:.2f}s: "
+              f"{len(catalog.products)} уникальных товаров в {len(catalog.salon_positions)} салонах")
+        return catalog
+
+    def get_catalog(self) -> MultiSalonCatalog:
+        """Объединенный каталог; пересобирается только если изменился какой-либо фид"""
+        feeds = []
+        for salon_name, feed_file in self.feed_service.salons.items():
+            cached = self.feed_service.get_catalog(feed_file)
+            if cached:
+                feeds.append((salon_name, feed_file, cached))
+
+        versions = {feed_file: cached.version for _, feed_file, cached in feeds}
+        catalog = self._catalog
+        if catalog is not None and catalog.versions == versions:
+            return catalog
+
+        with self._lock:
+            if self._catalog is not None and self._catalog.versions == versions:
+                return self._catalog
+            catalog = self._merge(feeds, versions)
+            self._catalog = catalog
+            return catalog
+
+    def search(self, question: str) -> Dict[str, List[Product]]:
+        """Один проход фильтра по объединенному каталогу, результат сгруппирован по салонам"""
+        print(f"🔍 Поиск по объединенному каталогу: '{question}'")
+        catalog = self.get_catalog()
+        matched = self.filter_service.filter_products(
+            question, catalog.products, catalog.index)
+        matched_ids = {id(product) for product in matched}
+
+        grouped: Dict[str, List[Product]] = {}
+        for salon_name, positions in catalog.salon_positions.items():
+            salon_products = [self._with_salon_quantity(catalog, catalog.products[pos], salon_name)
+                              for pos in positions if id(catalog.products[pos]) in matched_ids]
+            if salon_products:
+                grouped[salon_name] = salon_products
+
+        print(f"🌐 Найдено {len(matched)} товаров в {len(grouped)} салонах")
+        return grouped
+
+    @staticmethod
+    def _with_salon_quantity(catalog: MultiSalonCatalog, product: Product, salon_name: str) -> Product:
+        """Товар с остатком указанного салона (копия — только если остаток отличается)"""
+        quantity = catalog.get_quantity(product.id, salon_name)
+        if quantity is None or quantity == product.quantity:
+            return product
+        return replace(product, quantity=quantity)
+
+    def _merge(self, feeds: List[Tuple[str, str, object]], versions: Dict[str, str]) -> MultiSalonCatalog:
+        merge_start = time.perf_counter()
+        catalog = MultiSalonCatalog(versions=versions)
+        positions_by_id: Dict[str, int] = {}
+
+        for salon_name, _, cached in feeds:
+            salon_positions = []
+            for product in cached.products:
+                pos = positions_by_id.get(product.id)
+                if pos is None:
+                    pos = positions_by_id[product.id] = len(catalog.products)
+                    catalog.products.append(product)
+                catalog.availability.setdefault(product.id, {})[salon_name] = product.quantity
+                salon_positions.append(pos)
+            catalog.salon_positions[salon_name] = salon_positions
+
+        catalog.index = ProductIndex(
+            catalog.products, self.filter_service.brand_keywords.keys())
+        print(f"🧩 Объединенный каталог собран за {time.perf_counter() - merge_start:.3f}s: "
+              f"{len(catalog.products)} товаров из {len(feeds)} фидов")
+        return catalog
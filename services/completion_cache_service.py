@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from services.cache_service import CacheService
+from utils.helpers import atomic_write
+
+
+class CompletionCache:
+    """
+    LRU+TTL кэш ответов LLM поверх CacheService. Ответ детерминирован (temperature=0),
+    поэтому ключ — модель, параметры, системный промпт, нормализованный вопрос и id
+    документов контекста в порядке выдачи. Привязан к версии базы знаний: при ее смене
+    кэш очищается, ведь тексты документов с теми же id могли измениться.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: float = 86400,
+                 persist_path: Optional[str] = None, persist_every: int = 20,
+                 max_bytes: int = 16 * 1024 * 1024):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persist_path = persist_path
+        self.persist_every = persist_every
+        self.kb_version: Optional[str] = None
+        # Время записи — time.time(), поэтому TTL переживает перезапуск вместе с файлом
+        self._store = CacheService(timeout=ttl, max_entries=max_size, max_bytes=max_bytes,
+                                   sweep_interval=min(ttl, 600.0))
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.invalidations = 0
+
+        if persist_path:
+            self.load()
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        return " ".join(question.lower().split()).rstrip(" ?!.")
+
+    @classmethod
+    def make_key(cls, model: str, system_prompt: str, question: str,
+                 doc_ids: Iterable[str], **params) -> str:
+        payload = json.dumps({
+            'model': model,
+            'params': params,
+            'system': hashlib.sha256(system_prompt.encode('utf-8')).hexdigest(),
+            'question': cls.normalize(question),
+            'docs': list(doc_ids),
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def set_kb_version(self, kb_version: Optional[str]) -> None:
+        """Запоминает версию базы знаний; ответы, построенные по другой версии, удаляются"""
+        with self._lock:
+            if kb_version == self.kb_version:
+                return
+            if len(self._store):
+                print(f"🧹 База знаний изменилась, кэш ответов LLM очищен ({len(self._store)} записей)")
+                self.invalidations += 1
+                self._store.clear()
+            self.kb_version = kb_version
+            self._unsaved = 0
+        if self.persist_path:
+            self.save()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._store.get(key)
+
+    def put(self, key: str, answer: str) -> None:
+        if self.max_size <= 0 or not answer:
+            return
+        self._store.set(key, answer)
+        with self._lock:
+            self._unsaved += 1
+            should_save = self.persist_path and self._unsaved >= self.persist_every
+        if should_save:
+            self.save()
+
+    def clear(self) -> None:
+        self._store.clear()
+        with self._lock:
+            self._unsaved = 0
+
+    def save(self, path: Optional[str] = None) -> bool:
+        """Сохраняет кэш на диск (атомарно, через временный файл)"""
+        path = path or self.persist_path
+        if not path:
+            return False
+        with self._lock:
+            data = {
+                'kb_version': self.kb_version,
+                'entries': [list(entry) for entry in self._store.items()],
+            }
+            if path == self.persist_path:
+                self._unsaved = 0
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with atomic_write(path) as f:
+                json.dump(data, f, ensure_ascii=False)
+            print(f"💾 Кэш ответов LLM сохранен: {len(data['entries'])} записей")
+            return True
+        except Exception as e:
+            print(f"⚠️ Не удалось сохранить кэш ответов LLM: {e}")
+            return False
+
+    def load(self, path: Optional[str] = None) -> bool:
+        """
+        Загружает кэш с диска вместе с версией базы знаний, для которой он построен.
+        Просроченные записи пропускаются, размер не превышает max_size.
+        """
+        path = path or self.persist_path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            now = time.time()
+            entries = [(key, created, answer) for key, created, answer in data.get('entries', [])
+                       if now - created < self.ttl]
+            with self._lock:
+                self.kb_version = data.get('kb_version')
+            for key, created, answer in entries[-self.max_size:]:
+                if len(self._store) >= self.max_size:
+                    break
+                self._store.set(key, answer, created_at=created)
+            loaded = len(self._store)
+            print(f"✅ Кэш ответов LLM загружен: {loaded} записей")
+            return True
+        except Exception as e:
+            print(f"⚠️ Не удалось загрузить кэш ответов LLM: {e}")
+            return False
+
+    def get_stats(self) -> Dict:
+        stats = self._store.get_stats()
+        stats.update({
+            'invalidations': self.invalidations,
+            'kb_version': self.kb_version,
+            'persist_path': self.persist_path,
+        })
+        return stats
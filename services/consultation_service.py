@@ -2,7 +2,7 @@
 import os
 import re
 import sys
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 
 # Устанавливаем правильное кодирование для консоли Windows
 if sys.stdout.encoding != 'utf-8':
@@ -16,8 +16,16 @@ class ConsultationService:
         self.stelki_file = Config.STELKI_FILE
 
     def get_consultation_response(self, question: str, groq_client, data: Optional[Dict[str, str]] = None) -> str:
+        """Консультация по стелькам (только текст ответа, см. consult)"""
+        return self.consult(question, groq_client, data)[0]
+
+    def consult(self, question: str, groq_client,
+                data: Optional[Dict[str, str]] = None) -> Tuple[str, bool]:
         """Консультация по стелькам — RAG: используем локальную базу и модель.
 
+        Возвращает (ответ, окончательный): False — запасной ответ после ошибки
+        (фрагмент базы вместо ответа модели, сообщение об ошибке), его нельзя кэшировать.
+
         Параметры:
         - question: текст вопроса клиента
         - groq_client: инициализированный клиент Groq
@@ -65,21 +73,21 @@ class ConsultationService:
                     model_ans = getattr(
                         response.choices[0].message, 'content', None) if response else None
                     if model_ans:
-                        return model_ans
+                        return model_ans, True
                     # Если модель вернула пусто — падаем к локальному ранжированию
                 except Exception as e:
                     print(f"⚠️ Ошибка вызова модели в консультации: {e}")
 
                 # Фоллбек — берём лучший фрагмент из локальной базы
-                return self._get_answer_from_file(question, stelki_text)
+                return self._get_answer_from_file(question, stelki_text), False
 
             # По умолчанию (вне темы стелек) — возвращаем общее сообщение
-            return "❗ Сейчас я могу давать консультации только по индивидуальным стелькам."
+            return "❗ Сейчас я могу давать консультации только по индивидуальным стелькам.", True
 
         except Exception as e:
             error_msg = "Извините, произошла ошибка. Попробуйте позже."
             print(f"❌ Ошибка консультации: {e}")
-            return error_msg
+            return error_msg, False
 
     def _is_about_individual_insoles(self, question: str) -> bool:
         """Проверяет, касается ли вопрос индивидуальных стелек"""
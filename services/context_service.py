@@ -1,75 +1,119 @@
 # -*- coding: utf-8 -*-
 import time
 import sys
-from typing import Dict, Optional, List, Any
+from typing import Callable, Dict, Optional, List, Any
 
 # Устанавливаем правильное кодирование для консоли Windows
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
 from models.product import Product
+from services.feed_service import FeedService
+from services.storage_backend import MemoryBackend
 
 
 class ContextService:
-    def __init__(self, timeout: int = 300):  # 5 минут
-        self.user_contexts = {}
+    """
+    Контексты поиска пользователей для «еще».
+
+    Контекст пользователя — несколько коротких полей: салон, вопрос, версия фида, курсор
+    и число найденных товаров (несколько сотен байт независимо от выдачи). Сам список id
+    найденных товаров общий для всех, кто задал тот же вопрос по той же версии фида,
+    и хранится отдельно (result_sets); «еще» читает из него только страницу и берет товары
+    из кэша фидов. Если список уже вытеснен, поиск повторяется через search.
+    """
+
+    def __init__(self, timeout: int = 300,  # 5 минут
+                 feed_service: Optional[FeedService] = None,
+                 backend=None, result_backend=None,
+                 search: Optional[Callable[[str, str, str], List[Product]]] = None,
+                 result_timeout: float = 1800):
+        self.user_contexts = backend or MemoryBackend()
+        self.result_sets = result_backend or MemoryBackend()
         self.timeout = timeout
+        self.result_timeout = max(result_timeout, timeout)
+        self.feed_service = feed_service or FeedService()
+        self.search = search
+        self.restored = 0
+
+    @staticmethod
+    def result_key(feed_version: str, question: str) -> str:
+        return f"{feed_version}:{' '.join(question.lower().split())}"
 
     def get_user_context(self, user_id: str) -> Optional[Dict[str, Any]]:
-        """Получаем контекст пользователя"""
-        if user_id in self.user_contexts:
-            context = self.user_contexts[user_id]
-            # Проверяем не устарел ли контекст
-            if time.time() - context.get('timestamp', 0) < self.timeout:
-                return context
-            else:
-                del self.user_contexts[user_id]
-                print(f"🗑️ Контекст для {user_id} устарел")
-        return None
-
-    def set_search_context(self, user_id: str, salon_name: str, original_question: str,
-                           all_products: List[Product], shown_products: List[Product]):
-        """Сохраняем контекст поиска"""
-        self.user_contexts[user_id] = {
+        """Получаем контекст пользователя (устаревший контекст хранилище уже удалило)"""
+        return self.user_contexts.get(user_id)
+
+    def store_result_set(self, feed_version: str, question: str, product_ids: List[str]) -> None:
+        """Сохраняем общий для всех пользователей список id найденных товаров"""
+        self.result_sets.set_list(self.result_key(feed_version, question), product_ids, self.result_timeout)
+
+    def set_search_context(self, user_id: str, salon_name: str, feed_file: str, feed_version: str,
+                           original_question: str, total: int, shown: int):
+        """Сохраняем контекст поиска: ссылку на список найденных товаров и курсор"""
+        self.user_contexts.set(user_id, {
             'type': 'search',
             'salon_name': salon_name,
+            'feed_file': feed_file,
+            'feed_version': feed_version,
             'original_question': original_question,
-            'all_products': all_products,
-            'shown_products': shown_products,
+            'total': total,
+            'cursor': shown,
             'timestamp': time.time()
-        }
+        }, self.timeout)
         print(
-            f"💾 Сохраняем контекст поиска для {user_id}: {salon_name}, показано {len(shown_products)} из {len(all_products)}")
+            f"💾 Сохраняем контекст поиска для {user_id}: {salon_name}, показано {shown} из {total}")
 
     def get_more_products(self, user_id: str, count: int = 5) -> Optional[List[Product]]:
         """Получаем следующие товары из контекста"""
         context = self.get_user_context(user_id)
-        if not context or context['type'] != 'search':
+        # Контексты старого формата (до курсора) просто считаем отсутствующими
+        if not context or context['type'] != 'search' or 'cursor' not in context:
             return None
 
-        shown_ids = {p.id for p in context['shown_products']}
-        all_products = context['all_products']
+        cursor = context['cursor']
+        if cursor >= context['total']:
+            return []
 
-        # Ищем еще не показанные товары
-        more_products = []
-        for product in all_products:
-            if product.id not in shown_ids:
-                more_products.append(product)
-            if len(more_products) >= count:
-                break
+        page_ids = self.result_sets.get_list_range(
+            self.result_key(context['feed_version'], context['original_question']),
+            cursor, cursor + count)
+        if page_ids is None:
+            page_ids = self._restore_result_set(context)[cursor:cursor + count]
 
-        if more_products:
+        more_products = self.feed_service.get_products_by_ids(context['feed_file'], page_ids)
+
+        if page_ids:
             # Обновляем контекст
-            context['shown_products'].extend(more_products)
+            context['cursor'] = cursor + len(page_ids)
             context['timestamp'] = time.time()
+            self.user_contexts.set(user_id, context, self.timeout)
+        if more_products:
             print(f"📦 Нашли еще {len(more_products)} товаров для {user_id}")
 
         return more_products
 
+    def _restore_result_set(self, context: Dict[str, Any]) -> List[str]:
+        """Повторяет поиск, если общий список вытеснен (по текущей версии фида)"""
+        if self.search is None:
+            return []
+        catalog = self.feed_service.get_catalog(context['feed_file'])
+        if catalog is None:
+            return []
+        if catalog.version != context['feed_version']:
+            print(f"🔄 Фид {context['feed_file']} обновился, товары для «еще» ищем заново")
+        product_ids = [product.id for product in self.search(
+            context['original_question'], context['salon_name'], context['feed_file'])]
+        self.store_result_set(catalog.version, context['original_question'], product_ids)
+        context['feed_version'] = catalog.version
+        context['total'] = len(product_ids)
+        self.restored += 1
+        return product_ids
+
     def clear_user_context(self, user_id: str):
         """Очищаем контекст пользователя"""
-        if user_id in self.user_contexts:
-            del self.user_contexts[user_id]
+        if self.user_contexts.get(user_id) is not None:
+            self.user_contexts.delete(user_id)
             print(f"🧹 Очищаем контекст для {user_id}")
 
     def get_context_info(self, user_id: str) -> str:
@@ -79,6 +123,6 @@ class ContextService:
             return "Контекст отсутствует"
 
         if context['type'] == 'search':
-            return f"Поиск в {context['salon_name']}, показано {len(context['shown_products'])} из {len(context['all_products'])}"
+            return f"Поиск в {context['salon_name']}, показано {context['cursor']} из {context['total']}"
 
         return f"Контекст типа: {context['type']}"
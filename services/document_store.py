@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import sys
+import json
+import mmap
+import struct
+import operator
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Union
+
+import numpy as np
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from utils.helpers import atomic_write
+
+
+class DocumentStore:
+    """
+    Таблица документов только для чтения в компактном бинарном файле, открытом через mmap.
+    Несколько процессов (воркеры gunicorn, машины с общим образом) делят страницы
+    файла в page cache вместо отдельной копии списка словарей в каждом процессе.
+
+    Формат файла:
+        MAGIC (8 байт) | count: uint64 | offsets: uint64 × (count + 1) | документы в UTF-8 JSON
+    Документ i — байты [offsets[i], offsets[i + 1]) относительно начала области данных.
+    Доступ как к последовательности: len(store), store[i], итерация.
+
+    Последние cache_size раскодированных документов держатся в LRU: поиск на каждом
+    запросе обращается к одним и тем же документам, и JSON не разбирается повторно.
+    Возвращаемые словари общие для всех обращений — не изменяйте их.
+    """
+
+    MAGIC = b"ORTDOCS1"
+    _HEADER = struct.Struct("<8sQ")
+
+    def __init__(self, path: str, cache_size: int = 64):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, Dict]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.decoded = 0
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = self._HEADER.unpack_from(self._mm, 0)
+        if magic != self.MAGIC:
+            self._mm.close()
+            raise ValueError(f"Неизвестный формат таблицы документов: {path}")
+        self._count = count
+        # Смещения читаются прямо из отображенного файла, без копии
+        self._offsets = np.frombuffer(
+            self._mm, dtype='<u8', count=count + 1, offset=self._HEADER.size)
+        self._data_start = self._HEADER.size + (count + 1) * 8
+
+    @classmethod
+    def write(cls, path: str, documents: Iterable[Dict]) -> int:
+        """Записывает документы атомарно (через временный файл); возвращает их количество"""
+        blobs = [json.dumps(doc, ensure_ascii=False).encode('utf-8') for doc in documents]
+        offsets = np.zeros(len(blobs) + 1, dtype='<u8')
+        np.cumsum([len(blob) for blob in blobs], out=offsets[1:])
+        with atomic_write(path, 'wb') as f:
+            f.write(cls._HEADER.pack(cls.MAGIC, len(blobs)))
+            f.write(offsets.tobytes())
+            for blob in blobs:
+                f.write(blob)
+        return len(blobs)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Dict, List[Dict]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        i = operator.index(index)
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("индекс документа вне диапазона")
+        with self._cache_lock:
+            doc = self._cache.get(i)
+            if doc is not None:
+                self._cache.move_to_end(i)
+                return doc
+        start = self._data_start + int(self._offsets[i])
+        end = self._data_start + int(self._offsets[i + 1])
+        doc = json.loads(self._mm[start:end])
+        with self._cache_lock:
+            self.decoded += 1
+            if self.cache_size > 0:
+                self._cache[i] = doc
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return doc
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(self._count):
+            yield self[i]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._mm)
+
+    def close(self) -> None:
+        self._cache.clear()
+        self._offsets = None
+        self._mm.close()
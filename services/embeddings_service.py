@@ -3,6 +3,7 @@ import os
 import sys
 import json
 import time
+import hashlib
 import numpy as np
 from typing import List, Tuple, Dict, Optional
 from pathlib import Path
@@ -10,13 +11,12 @@ from pathlib import Path
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
-try:
-    from sentence_transformers import SentenceTransformer
-    import faiss
-except ImportError:
-    raise ImportError(
-        "Требуются зависимости: pip install sentence-transformers faiss-cpu numpy"
-    )
+from config import Config
+from services.query_cache_service import QueryEmbeddingCache
+from services.encoder_service import BatchingEncoder
+from services.encoder_backends import create_encoder
+from services.document_store import DocumentStore
+from utils.helpers import atomic_write
 
 try:
     from rank_bm25 import BM25Okapi
@@ -25,6 +25,44 @@ except ImportError:
     BM25Okapi = None
 
 
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "embeddings_v2")
+# Меняется при изменении состава/формата файлов в каталоге индексов
+INDEX_FORMAT_VERSION = 3
+DOCUMENT_STORE_FILE = "documents.bin"
+# Эмбеддинги типичных вопросов, посчитанные при сборке образа (build_index_bundle.py)
+QUERY_SEED_FILE = "query_cache_seed.npz"
+
+
+def _faiss():
+    """faiss импортируется при первом построении/загрузке индекса, а не при импорте модуля"""
+    try:
+        import faiss
+    except ImportError:
+        raise ImportError(
+            "Требуются зависимости: pip install sentence-transformers faiss-cpu numpy"
+        )
+    return faiss
+
+
+def _read_faiss_index(path: str):
+    """
+    Читает FAISS-индекс через mmap, чтобы процессы делили страницы в page cache.
+    IO_FLAG_MMAP_IFC (faiss >= 1.9) отображает векторы IndexFlat без копии. IO_FLAG_MMAP
+    векторы IndexFlat все равно копирует, поэтому без IFC индекс читается обычным
+    образом и режим честно сообщается как "copy".
+    """
+    faiss = _faiss()
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if flag is not None:
+        try:
+            return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY), "IO_FLAG_MMAP_IFC"
+        except Exception as e:
+            print(f"ℹ️ IO_FLAG_MMAP_IFC не поддерживается для {path}: {e}")
+    else:
+        print(f"ℹ️ faiss {getattr(faiss, '__version__', '?')} без IO_FLAG_MMAP_IFC: индекс копируется в память процесса")
+    return faiss.read_index(path), "copy"
+
+
 class EmbeddingsService:
     """
     Гибридный поиск с переранжированием по категориям.
@@ -36,6 +74,10 @@ class EmbeddingsService:
         knowledge_base_path: str = os.path.join(os.path.dirname(
             __file__), "..", "data", "knowledge_base.json"),
         cache_dir: Optional[str] = None,
+        query_cache_size: int = Config.QUERY_CACHE_SIZE,
+        query_cache_path: Optional[str] = Config.QUERY_CACHE_PATH,
+        backend: str = Config.EMBEDDINGS_BACKEND,
+        onnx_model_dir: str = Config.ONNX_MODEL_DIR,
     ):
         cache_dir = cache_dir or os.environ.get("HF_HOME", "/data/huggingface")
         if not os.path.exists(cache_dir):
@@ -43,27 +85,37 @@ class EmbeddingsService:
         os.environ["HF_HOME"] = cache_dir
 
         self.model_name = model_name
+        self.backend = backend
+        # Векторы разных бэкендов немного отличаются — кэши и индексы привязаны к паре модель+бэкенд
+        self.model_id = model_name if backend == "torch" else f"{model_name}#{backend}-int8"
         self.knowledge_base_path = knowledge_base_path
         self.cache_dir = cache_dir
 
-        print(f"📥 Загружаем модель: {model_name}...")
+        print(f"📥 Загружаем модель: {model_name} (бэкенд: {backend})...")
         print(f"💾 Кэш моделей: {cache_dir}")
         model_start = time.perf_counter()
-        self.model = SentenceTransformer(
-            model_name, 
-            device="cpu",
-            cache_folder=cache_dir
-        )
+        self.model = create_encoder(backend, model_name, cache_dir, onnx_model_dir)
         self.embedding_dim = self.model.get_sentence_embedding_dimension()
         model_elapsed = time.perf_counter() - model_start
         print(f"✅ Модель загружена за {model_elapsed:.2f}s. Размер вектора: {self.embedding_dim}")
 
-        self.locations = []
-        self.sections = []
+        self.query_cache = QueryEmbeddingCache(
+            self.model_id, query_cache_size, query_cache_path)
+        self.encoder = BatchingEncoder(
+            self._encode_batch, Config.ENCODER_MAX_BATCH_SIZE, Config.ENCODER_MAX_WAIT_MS)
+
+        # Таблица документов: список словарей при построении индексов (_load_knowledge_base)
+        # или DocumentStore через mmap после load_indices
         self.all_documents = []
+        self.doc_index: Dict[str, int] = {}
+        self.document_counts: Dict[str, int] = {}
 
         self.semantic_index = None
         self.bm25_index = None
+        # Ключ _document_key(text) → L2-нормализованный эмбеддинг документа
+        self.document_embeddings: Dict[str, np.ndarray] = {}
+        # Время загрузки индексов по компонентам (заполняет load_indices)
+        self.load_timings: Dict = {}
 
         # Маппинг вопросов на категории
         self.category_keywords = {
@@ -90,31 +142,39 @@ class EmbeddingsService:
             'contacts': ['телефон', 'контакты', 'связь', 'email', 'мессенджер', 'позвонить', 'написать'],
         }
 
-        self._load_knowledge_base()
+        # Только хэш базы знаний: если набор индексов актуален, документы берутся из mmap
+        # (load_indices), а разбирается база лишь для построения индексов
+        self._read_knowledge_base()
 
-    def _load_knowledge_base(self) -> None:
-        """Загружает структурированные данные"""
+    def _read_knowledge_base(self) -> bytes:
+        """Читает базу знаний и запоминает ее версию (sha256 содержимого)"""
         if not os.path.exists(self.knowledge_base_path):
             raise FileNotFoundError(
                 f"Knowledge base не найдена: {self.knowledge_base_path}")
+        with open(self.knowledge_base_path, 'rb') as f:
+            raw_kb = f.read()
+        # Версия базы знаний: по ней проверяется актуальность сохраненных индексов
+        self.kb_version = hashlib.sha256(raw_kb).hexdigest()
+        return raw_kb
 
+    def _load_knowledge_base(self) -> None:
+        """Загружает структурированные данные в таблицу документов (для построения индексов)"""
         load_start = time.perf_counter()
-        with open(self.knowledge_base_path, 'r', encoding='utf-8') as f:
-            kb = json.load(f)
+        kb = json.loads(self._read_knowledge_base().decode('utf-8'))
         load_elapsed = time.perf_counter() - load_start
 
-        self.locations = kb.get('locations', [])
-        print(f"📍 Загружено адресов: {len(self.locations)}")
+        locations = kb.get('locations', [])
+        print(f"📍 Загружено адресов: {len(locations)}")
 
-        self.sections = kb.get('sections', {})
-        print(f"📚 Загружено секций: {len(self.sections)}")
+        sections = kb.get('sections', {})
+        print(f"📚 Загружено секций: {len(sections)}")
         print(f"🧾 Загрузка базы знаний заняла {load_elapsed:.2f}s")
 
         self.all_documents = []
 
         # Добавляем sections
         section_idx = 0
-        for key, section in self.sections.items():
+        for key, section in sections.items():
             section_text = f"{section['title']}. {section['content']}"
 
             self.all_documents.append({
@@ -128,7 +188,7 @@ class EmbeddingsService:
             section_idx += 1
 
         # Добавляем locations
-        for i, loc in enumerate(self.locations):
+        for i, loc in enumerate(locations):
             location_text = f"Салон ORTOS {loc['city']}. Адрес: {loc['address']}. Часы: {loc['working_hours']}. Телефоны: {', '.join(loc.get('phones', []))}."
 
             self.all_documents.append({
@@ -143,53 +203,114 @@ class EmbeddingsService:
             })
 
         print(f"📄 Всего документов: {len(self.all_documents)}")
-
-    def _build_indices(self) -> None:
-        """Создает индексы"""
+        self._build_document_lookup()
+
+    def _build_document_lookup(self) -> None:
+        """id → индекс документа, число документов по типам и матрица документ×категория для буста"""
+        self.doc_index = {}
+        self.document_counts = {}
+        self.category_names = list(self.category_keywords.keys())
+        category_positions = {name: i for i, name in enumerate(self.category_names)}
+        self.category_matrix = np.zeros(
+            (len(self.all_documents), len(self.category_names)), dtype=np.float64)
+        for i, doc in enumerate(self.all_documents):
+            self.doc_index[doc['id']] = i
+            self.document_counts[doc['type']] = self.document_counts.get(doc['type'], 0) + 1
+            if doc['type'] == 'section' and doc['key'] in category_positions:
+                self.category_matrix[i, category_positions[doc['key']]] = 1.0
+
+    def get_document(self, doc_id: str) -> Optional[Dict]:
+        idx = self.doc_index.get(doc_id)
+        return self.all_documents[idx] if idx is not None else None
+
+    def _build_indices(self, index_dir: str = DEFAULT_INDEX_DIR) -> None:
+        """Создает индексы, перекодируя только новые и измененные документы"""
         print(f"\n🔨 Создаем индексы...")
         build_start = time.perf_counter()
+        self._load_knowledge_base()
 
         texts = [doc['text'] for doc in self.all_documents]
+        keys = [self._document_key(text) for text in texts]
 
         print("  📊 Создаем semantic индекс...")
         semantic_start = time.perf_counter()
-        embeddings = self.model.encode(
-            texts,
-            convert_to_tensor=False,
-            show_progress_bar=True,
-            batch_size=32,
-        )
-        embeddings = np.array(embeddings, dtype=np.float32)
+        cached = self._load_document_embeddings(index_dir)
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        if missing:
+            new_embeddings = self.model.encode(
+                [texts[i] for i in missing],
+                show_progress_bar=True,
+                batch_size=32,
+            )
+            new_embeddings = np.array(new_embeddings, dtype=np.float32)
+            _faiss().normalize_L2(new_embeddings)
+            for i, vector in zip(missing, new_embeddings):
+                cached[keys[i]] = vector
+        removed = len(set(cached) - set(keys))
+        print(f"  🧮 Эмбеддинги: переиспользовано {len(keys) - len(missing)}, закодировано {len(missing)}, удалено {removed}")
+
+        # Оставляем только векторы текущих документов — удаленные секции не храним
+        self.document_embeddings = {key: cached[key] for key in keys}
+        embeddings = np.vstack([self.document_embeddings[key] for key in keys]).astype(np.float32)
         print(f"  📐 Embeddings shape: {embeddings.shape}")
-        faiss.normalize_L2(embeddings)
 
-        self.semantic_index = faiss.IndexFlatIP(self.embedding_dim)
+        self.semantic_index = _faiss().IndexFlatIP(self.embedding_dim)
         self.semantic_index.add(embeddings)
         semantic_elapsed = time.perf_counter() - semantic_start
         print(f"  ✅ Semantic индекс: {self.semantic_index.ntotal} векторов за {semantic_elapsed:.2f}s, dim={self.embedding_dim}")
 
-        if BM25Okapi:
-            print("  🔤 Создаем BM25 индекс...")
-            bm25_start = time.perf_counter()
-            tokenized_texts = [text.lower().split() for text in texts]
-            self.bm25_index = BM25Okapi(tokenized_texts)
-            bm25_elapsed = time.perf_counter() - bm25_start
-            print(f"  ✅ BM25 индекс создан за {bm25_elapsed:.2f}s, документов={len(tokenized_texts)}")
+        self._build_bm25()
 
         total_elapsed = time.perf_counter() - build_start
         print(f"⏱️ Построение индексов завершено за {total_elapsed:.2f}s")
 
-    def _get_category_boost(self, query: str, doc_key: str) -> float:
-        """Вычисляет boost для категории на основе ключевых слов в вопросе"""
-        query_lower = query.lower()
-
-        if doc_key in self.category_keywords:
-            keywords = self.category_keywords[doc_key]
-            matches = sum(1 for kw in keywords if kw in query_lower)
-            if matches > 0:
-                return 1.0 + (matches * 0.15)
-
-        return 1.0
+    def _document_key(self, text: str) -> str:
+        """Ключ эмбеддинга документа: хэш модели и текста"""
+        return hashlib.sha256(f"{self.model_id}\n{text}".encode('utf-8')).hexdigest()
+
+    def _load_document_embeddings(self, index_dir: str) -> Dict[str, np.ndarray]:
+        """Ранее посчитанные эмбеддинги документов (в памяти или из doc_embeddings.npz)"""
+        if self.document_embeddings:
+            return dict(self.document_embeddings)
+        path = f"{index_dir}/doc_embeddings.npz"
+        if not os.path.exists(path):
+            return {}
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                vectors = data['vectors']
+                if vectors.shape[1:] != (self.embedding_dim,):
+                    return {}
+                return {str(key): vectors[i] for i, key in enumerate(data['keys'])}
+        except Exception as e:
+            print(f"⚠️ Не удалось прочитать кэш эмбеддингов документов: {e}")
+            return {}
+
+    def _build_bm25(self) -> None:
+        if not BM25Okapi:
+            return
+        print("  🔤 Создаем BM25 индекс...")
+        bm25_start = time.perf_counter()
+        tokenized_texts = [doc['text'].lower().split() for doc in self.all_documents]
+        self.bm25_index = BM25Okapi(tokenized_texts)
+        bm25_elapsed = time.perf_counter() - bm25_start
+        print(f"  ✅ BM25 индекс создан за {bm25_elapsed:.2f}s, документов={len(tokenized_texts)}")
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=len(texts), show_progress_bar=False)
+
+    def encode_query(self, query: str) -> np.ndarray:
+        """L2-нормализованный эмбеддинг запроса (1, dim) с LRU-кэшем"""
+        key = self.query_cache.normalize(query)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Параллельные запросы объединяются в один батч модели
+        query_embedding = np.array(
+            self.encoder.encode(key), dtype=np.float32).reshape(1, -1)
+        _faiss().normalize_L2(query_embedding)
+        self.query_cache.put(key, query_embedding)
+        return query_embedding
 
     def search(
         self,
@@ -206,22 +327,25 @@ class EmbeddingsService:
             return []
 
         print(f"🔎 Запрос поиска: '{query.strip()}', top_k={top_k}, min_score={min_score}")
-        results = {}
+        n_docs = len(self.all_documents)
+        # Все оценки хранятся в векторах, выровненных по индексу документа
+        scores = np.zeros(n_docs, dtype=np.float64)
+        # Порядок добавления кандидата: при равных оценках сохраняется прежний порядок сортировки
+        order = np.full(n_docs, np.inf)
 
         # ===== SEMANTIC SEARCH =====
-        query_embedding = self.model.encode([query], convert_to_tensor=True)
-        query_embedding = query_embedding.cpu().numpy()
-        faiss.normalize_L2(query_embedding)
+        query_embedding = self.encode_query(query)
 
         distances, indices = self.semantic_index.search(
-            query_embedding, min(top_k * 4, len(self.all_documents)))
+            query_embedding, min(top_k * 4, n_docs))
 
-        for i, idx in enumerate(indices[0]):
-            if idx == -1:
-                continue
-            doc_id = self.all_documents[idx]['id']
-            score = float(distances[0][i])
-            results[doc_id] = score
+        found = indices[0] != -1
+        dense_idx = indices[0][found]
+        dense_mask = np.zeros(n_docs, dtype=bool)
+        dense_mask[dense_idx] = True
+        scores[dense_idx] = distances[0][found].astype(np.float64)
+        order[dense_idx] = np.arange(len(dense_idx))
+        candidates = dense_mask.copy()
 
         # ===== BM25 BOOST =====
         if self.bm25_index:
@@ -231,44 +355,35 @@ class EmbeddingsService:
 
             if max_bm25 > 0:
                 bm25_scores = bm25_scores / max_bm25
+                bm25_mask = bm25_scores > 0.05
 
-                for idx, score in enumerate(bm25_scores):
-                    if score > 0.05:
-                        doc_id = self.all_documents[idx]['id']
-                        if doc_id in results:
-                            results[doc_id] = results[doc_id] * \
-                                0.6 + score * 0.4
-                        else:
-                            results[doc_id] = score * 0.3
+                both = bm25_mask & dense_mask
+                scores[both] = scores[both] * 0.6 + bm25_scores[both] * 0.4
+                only_bm25 = bm25_mask & ~dense_mask
+                scores[only_bm25] = bm25_scores[only_bm25] * 0.3
+                order[only_bm25] = len(dense_idx) + np.flatnonzero(only_bm25)
+                candidates |= bm25_mask
 
         # ===== ПЕРЕРАНЖИРОВАНИЕ ПО КАТЕГОРИЯМ =====
-        for doc_id, score in list(results.items()):
-            doc = next(
-                (d for d in self.all_documents if d['id'] == doc_id), None)
-            if doc and doc['type'] == 'section':
-                category_boost = self._get_category_boost(query, doc['key'])
-                if category_boost != 1.0:
-                    print(f"  🎯 Boost категории для {doc['title']} ({doc['key']}): x{category_boost:.2f}")
-                results[doc_id] = score * category_boost
+        query_lower = query.lower()
+        category_matches = np.array(
+            [sum(1 for kw in self.category_keywords[name] if kw in query_lower)
+             for name in self.category_names], dtype=np.float64)
+        boosts = 1.0 + (self.category_matrix @ category_matches) * 0.15
+        scores[candidates] = scores[candidates] * boosts[candidates]
+        for idx in np.flatnonzero(candidates & (boosts != 1.0)):
+            doc = self.all_documents[idx]
+            print(f"  🎯 Boost категории для {doc['title']} ({doc['key']}): x{boosts[idx]:.2f}")
 
         # ===== СОРТИРОВКА И ФИЛЬТРАЦИЯ =====
-        sorted_results = sorted(
-            results.items(), key=lambda x: x[1], reverse=True)
-
-        output = []
-        for doc_id, score in sorted_results:
-            if len(output) >= top_k:
-                break
+        selected = np.flatnonzero(candidates & (scores >= min_score))
+        if len(selected) > top_k > 0:
+            # argpartition отбирает top_k, затем добираем равные k-й оценке для стабильного порядка
+            kth_score = scores[selected[np.argpartition(-scores[selected], top_k - 1)[:top_k]]].min()
+            selected = selected[scores[selected] >= kth_score]
+        selected = selected[np.lexsort((order[selected], -scores[selected]))][:top_k]
 
-            if score < min_score:
-                break
-
-            doc = next(
-                (d for d in self.all_documents if d['id'] == doc_id), None)
-            if not doc:
-                continue
-
-            output.append((doc, score))
+        output = [(self.all_documents[idx], float(scores[idx])) for idx in selected]
 
         if output:
             top_score = output[0][1]
@@ -283,66 +398,218 @@ class EmbeddingsService:
 
         return output
 
-    def build_indices(self) -> None:
+    def build_indices(self, index_dir: str = DEFAULT_INDEX_DIR) -> None:
         """Публичный метод для создания индексов"""
-        self._build_indices()
+        self._build_indices(index_dir)
+
+    @property
+    def bundle_version(self) -> str:
+        """Штамп набора индексов: формат + версия базы знаний + модель"""
+        stamp = f"{INDEX_FORMAT_VERSION}:{self.kb_version}:{self.model_id}"
+        return hashlib.sha256(stamp.encode('utf-8')).hexdigest()[:16]
 
-    def save_indices(self, index_dir: str = os.path.join(os.path.dirname(__file__), "..", "data", "embeddings_v2")) -> None:
-        """Сохраняет индексы на диск"""
+    def save_indices(self, index_dir: str = DEFAULT_INDEX_DIR, built_by: str = "runtime") -> None:
+        """Сохраняет полный набор индексов: FAISS, BM25, таблицу документов и матрицу категорий"""
         Path(index_dir).mkdir(parents=True, exist_ok=True)
 
         if self.semantic_index:
-            faiss.write_index(self.semantic_index,
-                              f"{index_dir}/semantic.faiss")
+            # Через временный файл: загруженный индекс может быть отображен из этого же файла
+            with atomic_write(f"{index_dir}/semantic.faiss", 'wb') as f:
+                f.write(_faiss().serialize_index(self.semantic_index).tobytes())
             print(f"✅ Semantic индекс сохранен")
 
+        if self.bm25_index:
+            with atomic_write(f"{index_dir}/bm25.json") as f:
+                json.dump(self._bm25_state(), f, ensure_ascii=False)
+            print(f"✅ BM25 индекс сохранен")
+
+        if self.document_embeddings:
+            keys = [self._document_key(doc['text']) for doc in self.all_documents]
+            with atomic_write(f"{index_dir}/doc_embeddings.npz", 'wb') as f:
+                np.savez(f, keys=np.array(keys, dtype=str),
+                         vectors=np.vstack([self.document_embeddings[key] for key in keys]))
+
+        store_path = f"{index_dir}/{DOCUMENT_STORE_FILE}"
+        # Таблица, загруженная из этого же файла, уже на диске (и отображена в память)
+        if not (isinstance(self.all_documents, DocumentStore)
+                and os.path.abspath(self.all_documents.path) == os.path.abspath(store_path)):
+            DocumentStore.write(store_path, self.all_documents)
+        with atomic_write(f"{index_dir}/category_matrix.npy", 'wb') as f:
+            np.save(f, np.asarray(self.category_matrix))
+
         metadata = {
+            'bundle_version': self.bundle_version,
+            'built_by': built_by,
+            'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'format_version': INDEX_FORMAT_VERSION,
+            'kb_version': self.kb_version,
             'model_name': self.model_name,
+            'model_id': self.model_id,
             'embedding_dim': self.embedding_dim,
             'total_documents': len(self.all_documents),
             'has_bm25': self.bm25_index is not None,
+            'category_names': self.category_names,
         }
 
-        with open(f"{index_dir}/metadata.json", 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        # metadata.json пишется последним: по нему набор считается полным
+        with atomic_write(f"{index_dir}/metadata.json") as f:
+            json.dump(metadata, f, ensure_ascii=False)
 
         print(f"✅ Метаданные сохранены")
+        self.query_cache.save()
 
-    def load_indices(self, index_dir: str = os.path.join(os.path.dirname(__file__), "..", "data", "embeddings_v2")) -> bool:
-        """Загружает индексы с диска, если они существуют"""
+    def load_indices(self, index_dir: str = DEFAULT_INDEX_DIR) -> bool:
+        """Загружает индексы с диска, если они построены для текущей базы знаний и модели"""
         semantic_path = f"{index_dir}/semantic.faiss"
         metadata_path = f"{index_dir}/metadata.json"
+        documents_path = f"{index_dir}/{DOCUMENT_STORE_FILE}"
 
         if not os.path.exists(semantic_path) or not os.path.exists(metadata_path):
             return False
 
+        try:
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except Exception as meta_error:
+            print(f"⚠️ Не удалось прочитать метаданные: {meta_error}")
+            return False
+
+        print(f"ℹ️ Метаданные индекса: model={metadata.get('model_name')}, dim={metadata.get('embedding_dim')}, docs={metadata.get('total_documents')}, "
+              f"bundle={metadata.get('bundle_version')} ({metadata.get('built_by')}, {metadata.get('built_at')})")
+        if metadata.get('bundle_version') != self.bundle_version:
+            if metadata.get('format_version') != INDEX_FORMAT_VERSION:
+                print(f"⚠️ Формат индексов устарел ({metadata.get('format_version')} != {INDEX_FORMAT_VERSION}), пересобираем")
+            elif metadata.get('kb_version') != self.kb_version:
+                print("⚠️ База знаний изменилась после построения индексов, пересобираем")
+            elif metadata.get('model_id') != self.model_id:
+                print(f"⚠️ Индексы построены другой моделью ({metadata.get('model_id')}), пересобираем")
+            else:
+                print(f"⚠️ Штамп индексов не совпадает ({metadata.get('bundle_version')} != {self.bundle_version}), пересобираем")
+            return False
+
+        timings: Dict[str, float] = {}
+
+        def timed(component: str, start: float) -> None:
+            timings[component] = time.perf_counter() - start
+
         try:
             load_start = time.perf_counter()
-            self.semantic_index = faiss.read_index(semantic_path)
-            metadata = {}
-            try:
-                with open(metadata_path, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
-            except Exception as meta_error:
-                print(f"⚠️ Не удалось прочитать метаданные: {meta_error}")
+            step = time.perf_counter()
+            semantic_index, faiss_mode = _read_faiss_index(semantic_path)
+            timed('faiss', step)
+
+            step = time.perf_counter()
+            documents = DocumentStore(documents_path)
+            timed('documents', step)
+            if semantic_index.ntotal != len(documents):
+                print(f"⚠️ Размер индекса ({semantic_index.ntotal}) не совпадает с таблицей документов ({len(documents)})")
+                return False
+
+            self.semantic_index = semantic_index
+            self.all_documents = documents
+            step = time.perf_counter()
+            self._build_document_lookup()
+            if metadata.get('category_names') == self.category_names:
+                self.category_matrix = np.load(f"{index_dir}/category_matrix.npy", mmap_mode='r')
+            timed('lookup', step)
+
+            step = time.perf_counter()
+            bm25_path = f"{index_dir}/bm25.json"
+            if BM25Okapi and os.path.exists(bm25_path):
+                with open(bm25_path, 'r', encoding='utf-8') as f:
+                    self.bm25_index = self._restore_bm25(json.load(f))
+            elif BM25Okapi:
+                # Без BM25 гибридный поиск тихо превращается в чисто векторный — строим заново
+                self._build_bm25()
+            timed('bm25', step)
+
+            step = time.perf_counter()
+            seed_path = f"{index_dir}/{QUERY_SEED_FILE}"
+            if os.path.exists(seed_path):
+                self.query_cache.load(seed_path)
+            timed('query_seed', step)
+
             load_elapsed = time.perf_counter() - load_start
+            timings['total'] = load_elapsed
+            self.load_timings = {name: round(value, 4) for name, value in timings.items()}
+            self.load_timings['faiss_mode'] = faiss_mode
             print(
-                f"✅ Semantic индекс загружен: {self.semantic_index.ntotal} векторов за {load_elapsed:.2f}s")
-            if metadata:
-                print(f"ℹ️ Метаданные индекса: model={metadata.get('model_name')}, dim={metadata.get('embedding_dim')}, docs={metadata.get('total_documents')}")
+                f"✅ Индексы загружены: {self.semantic_index.ntotal} векторов, bm25={self.bm25_index is not None} за {load_elapsed:.2f}s")
+            print("⏱️ Загрузка по компонентам: " + ", ".join(
+                f"{name}={value * 1000:.1f}ms" for name, value in timings.items() if name != 'total')
+                + f" (faiss: {faiss_mode}, документы: mmap {documents.nbytes} байт)")
             return True
         except Exception as e:
             print(f"❌ Ошибка загрузки индексов: {e}")
             return False
 
+    def _bm25_state(self) -> Dict:
+        """Статистики BM25 (термы по документам, idf, длины) для сохранения без повторной токенизации"""
+        bm25 = self.bm25_index
+        return {
+            'k1': bm25.k1,
+            'b': bm25.b,
+            'epsilon': bm25.epsilon,
+            'corpus_size': bm25.corpus_size,
+            'avgdl': bm25.avgdl,
+            'average_idf': bm25.average_idf,
+            'doc_len': bm25.doc_len,
+            'doc_freqs': bm25.doc_freqs,
+            'idf': bm25.idf,
+        }
+
+    def _restore_bm25(self, state: Dict):
+        bm25 = BM25Okapi.__new__(BM25Okapi)
+        bm25.tokenizer = None
+        for key, value in state.items():
+            setattr(bm25, key, value)
+        return bm25
+
     def get_stats(self) -> Dict:
         """Статистика индексов"""
         return {
             'total_documents': len(self.all_documents),
-            'total_locations': len(self.locations),
-            'total_sections': len(self.sections),
+            'total_locations': self.document_counts.get('location', 0),
+            'total_sections': self.document_counts.get('section', 0),
             'embedding_dim': self.embedding_dim,
             'model_name': self.model_name,
+            'backend': self.backend,
+            'kb_version': self.kb_version,
             'has_semantic_index': self.semantic_index is not None,
             'has_bm25_index': self.bm25_index is not None,
+            'query_cache': self.query_cache.get_stats(),
+            'encoder': self.encoder.get_stats(),
+            'load_timings': self.load_timings,
         }
+
+
+def prepare_embeddings_service() -> EmbeddingsService:
+    """Создает EmbeddingsService и загружает сохраненные индексы, при необходимости собирая их заново"""
+    service = EmbeddingsService()
+    print(f"✅ EmbeddingsService создан (база знаний {service.kb_version[:12]}, dim={service.embedding_dim})")
+    loaded = False
+    try:
+        load_flag_start = time.perf_counter()
+        loaded = service.load_indices()
+        load_flag_elapsed = time.perf_counter() - load_flag_start
+        print(f"📦 Попытка загрузки индексов завершена за {load_flag_elapsed:.2f}s: {loaded}")
+        if loaded:
+            stats_after_load = service.get_stats()
+            print(f"📦 Загруженные индексы: docs={stats_after_load['total_documents']}, semantic={stats_after_load['has_semantic_index']}, bm25={stats_after_load['has_bm25_index']}")
+    except Exception as e:
+        print(f"❌ Ошибка загрузки индексов: {e}")
+    if not loaded:
+        try:
+            print("🔨 Строим индексы...")
+            build_cycle_start = time.perf_counter()
+            service.build_indices()
+            stats_after_build = service.get_stats()
+            print(f"🆕 Построенные индексы: docs={stats_after_build['total_documents']}, semantic={stats_after_build['has_semantic_index']}, bm25={stats_after_build['has_bm25_index']}")
+            service.save_indices()
+            build_cycle_elapsed = time.perf_counter() - build_cycle_start
+            print(f"✅ Индексы созданы и сохранены за {build_cycle_elapsed:.2f}s")
+        except Exception as e:
+            print(f"❌ Ошибка создания индексов: {e}")
+    stats = service.get_stats()
+    print(f"📊 Embeddings scope: docs={stats['total_documents']}, sections={stats['total_sections']}, locations={stats['total_locations']}, dim={stats['embedding_dim']}")
+    return service
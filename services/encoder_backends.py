@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+from typing import List, Optional
+
+import numpy as np
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+
+ONNX_MODEL_FILE = "model_int8.onnx"
+POOLING_CONFIG_FILE = "pooling_config.json"
+
+
+class TorchEncoder:
+    """SentenceTransformer в fp32 на PyTorch (исходный вариант)"""
+
+    def __init__(self, model_name: str, cache_dir: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError(
+                "Требуются зависимости: pip install sentence-transformers faiss-cpu numpy"
+            )
+        self.model = SentenceTransformer(
+            model_name,
+            device="cpu",
+            cache_folder=cache_dir
+        )
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            convert_to_tensor=False,
+            show_progress_bar=show_progress_bar,
+            batch_size=batch_size,
+        )
+
+
+class OnnxEncoder:
+    """
+    Та же модель, экспортированная в ONNX и динамически квантованная в int8 (export_onnx.py).
+    Токенизатор и пулинг берутся из экспортированного SentenceTransformer.
+    """
+
+    def __init__(self, model_dir: str, max_length: int = 512, num_threads: Optional[int] = None):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError:
+            raise ImportError(
+                "Для ONNX-бэкенда требуются зависимости: pip install -r requirements-onnx.txt"
+            )
+
+        model_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"ONNX-модель не найдена: {model_path}. Запустите python export_onnx.py")
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        with open(os.path.join(model_dir, POOLING_CONFIG_FILE), 'r', encoding='utf-8') as f:
+            pooling = json.load(f)
+        self.pooling_mode = pooling.get('pooling_mode', 'mean')
+        self.embedding_dim = pooling['embedding_dimension']
+        self.max_length = min(max_length, pooling.get('max_seq_length', max_length))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.embedding_dim
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            tokens = self.tokenizer(
+                batch, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+            feeds = {name: tokens[name].astype(np.int64) for name in self.input_names if name in tokens}
+            hidden = self.session.run(None, feeds)[0]
+            outputs.append(self._pool(hidden, tokens['attention_mask']))
+        if not outputs:
+            return np.zeros((0, self.embedding_dim), dtype=np.float32)
+        return np.vstack(outputs).astype(np.float32)
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.pooling_mode == 'cls':
+            return hidden[:, 0]
+        # mean pooling по маске внимания, как Pooling(mean) в sentence-transformers
+        mask = attention_mask[..., None].astype(hidden.dtype)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+def create_encoder(backend: str, model_name: str, cache_dir: str, onnx_model_dir: Optional[str] = None):
+    """Создает кодировщик запрошенного бэкенда: "torch" или "onnx" """
+    if backend == "onnx":
+        return OnnxEncoder(onnx_model_dir)
+    if backend != "torch":
+        raise ValueError(f"Неизвестный бэкенд эмбеддингов: {backend}")
+    return TorchEncoder(model_name, cache_dir)
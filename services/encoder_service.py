@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+
+class BatchingEncoder:
+    """
+    Микро-батчинг запросов к модели: запросы, пришедшие из разных потоков Flask
+    в пределах max_wait_ms, кодируются одним вызовом encode.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray],
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0,
+                 latency_window: int = 1000):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stopped = False
+
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self._batch_sizes = deque(maxlen=latency_window)
+        self.total_requests = 0
+        self.total_batches = 0
+        self.errors = 0
+
+    def encode(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        """Эмбеддинг одного текста (без нормализации); блокирует до готовности батча"""
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future.result(timeout=timeout)
+
+    def close(self) -> None:
+        self._stopped = True
+        self._queue.put(None)
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="batching-encoder", daemon=True)
+                self._worker.start()
+
+    def _collect_batch(self) -> list:
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._stopped = True
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while not self._stopped:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+
+            # Одинаковые тексты в одном батче кодируем один раз
+            unique_texts = list(dict.fromkeys(text for text, _, _ in batch))
+            try:
+                vectors = np.asarray(self.encode_fn(unique_texts), dtype=np.float32)
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Ошибка батч-кодирования ({len(batch)} запросов): {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            rows = {text: vectors[i] for i, text in enumerate(unique_texts)}
+            done = time.perf_counter()
+            for text, future, _ in batch:
+                future.set_result(rows[text])
+            with self._stats_lock:
+                self._latencies.extend(done - enqueued_at for _, _, enqueued_at in batch)
+                self._batch_sizes.append(len(batch))
+                self.total_requests += len(batch)
+                self.total_batches += 1
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            latencies_ms = np.array(self._latencies, dtype=np.float64) * 1000.0
+            batch_sizes = list(self._batch_sizes)
+        stats = {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'requests': self.total_requests,
+            'batches': self.total_batches,
+            'errors': self.errors,
+            'queue_depth': self._queue.qsize(),
+            'avg_batch_size': float(np.mean(batch_sizes)) if batch_sizes else 0.0,
+        }
+        if len(latencies_ms):
+            p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+            stats.update({'latency_p50_ms': float(p50), 'latency_p95_ms': float(p95),
+                          'latency_p99_ms': float(p99)})
+        return stats
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+# Устанавливаем правильное кодирование для консоли Windows
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from models.product import Product
+from models.product_index import ProductIndex
+
+
+@dataclass
+class CachedFeed:
+    path: str
+    mtime_ns: int
+    size: int
+    version: str
+    products: List[Product] = field(default_factory=list)
+    loaded_at: float = 0.0
+    index: Optional[ProductIndex] = None
+    # id товара → товар; строится при первом обращении к товарам по id (контексты «еще»)
+    by_id: Optional[Dict[str, Product]] = None
+
+
+class FeedCacheService:
+    """
+    Процессный кэш распарсенных фидов.
+    Ключ — путь к файлу, актуальность проверяется по mtime/size и хэшу содержимого.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, CachedFeed] = {}
+        self._lock = threading.Lock()
+        self._path_locks: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def get(self, feed_path: str, parser: Callable[[str], List[Product]]) -> Optional[CachedFeed]:
+        """Возвращает распарсенный фид, перечитывая файл только при его изменении"""
+        try:
+            stat = os.stat(feed_path)
+        except OSError as e:
+            print(f"❌ Фид недоступен {feed_path}: {e}")
+            return None
+
+        entry = self._entries.get(feed_path)
+        if entry and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+            self.hits += 1
+            return entry
+
+        with self._get_path_lock(feed_path):
+            # Другой поток мог уже перечитать фид, пока мы ждали блокировку
+            entry = self._entries.get(feed_path)
+            if entry and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                self.hits += 1
+                return entry
+
+            self.misses += 1
+            try:
+                version = self._hash_file(feed_path)
+            except OSError as e:
+                print(f"❌ Ошибка чтения фида {feed_path}: {e}")
+                return None
+
+            if entry and entry.version == version:
+                # Файл «тронули», но содержимое не изменилось — парсить заново не нужно
+                entry.mtime_ns = stat.st_mtime_ns
+                entry.size = stat.st_size
+                return entry
+
+            load_start = time.perf_counter()
+            products = parser(feed_path)
+            new_entry = CachedFeed(
+                path=feed_path,
+                mtime_ns=stat.st_mtime_ns,
+                size=stat.st_size,
+                version=version,
+                products=products,
+                loaded_at=time.time(),
+            )
+            with self._lock:
+                if feed_path in self._entries:
+                    self.reloads += 1
+                self._entries[feed_path] = new_entry
+            print(f"📦 Фид {os.path.basename(feed_path)} закэширован: {len(products)} товаров за {time.perf_counter() - load_start:.3f}s")
+            return new_entry
+
+    def invalidate(self, feed_path: Optional[str] = None) -> None:
+        """Сбрасывает кэш одного фида или всех фидов"""
+        with self._lock:
+            if feed_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(feed_path, None)
+
+    def get_stats(self) -> Dict:
+        """Статистика кэша фидов"""
+        total = self.hits + self.misses
+        return {
+            'feeds': len(self._entries),
+            'products': sum(len(e.products) for e in self._entries.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def _hash_file(self, feed_path: str) -> str:
+        # Читаем кусками, чтобы не держать в памяти весь фид ради хэша
+        digest = hashlib.sha1()
+        with open(feed_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _get_path_lock(self, feed_path: str) -> threading.Lock:
+        with self._lock:
+            lock = self._path_locks.get(feed_path)
+            if lock is None:
+                lock = self._path_locks[feed_path] = threading.Lock()
+            return lock
+
+
+# Общий для всего процесса кэш: фиды меняются несколько раз в день, а читаются на каждый запрос
+feed_cache = FeedCacheService()
@@ -2,20 +2,22 @@
 import xml.etree.ElementTree as ET
 import re
 import sys
-from typing import List, Optional, Dict, Tuple
+from typing import Callable, Iterator, List, Optional, Dict, Tuple
 
 # Устанавливаем правильное кодирование для консоли Windows
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
-from models.product import Product
+from models.product import Product, intern_params
 from config import Config
+from services.feed_cache_service import FeedCacheService, CachedFeed, feed_cache
 
 
 class FeedService:
-    def __init__(self):
+    def __init__(self, cache: Optional[FeedCacheService] = None):
         self.salons = Config.SALONS
         self.feeds_dir = Config.FEEDS_DIR
+        self.cache = cache or feed_cache
 
     def detect_salon(self, question: str) -> Tuple[Optional[str], Optional[str]]:
         """Определяем салон из вопроса"""
@@ -25,10 +27,34 @@ class FeedService:
                 return salon_name, feed_file
         return None, None
 
+    def get_feed_path(self, salon_file: str) -> str:
+        return f"{self.feeds_dir}/{salon_file}"
+
+    def get_catalog(self, salon_file: str,
+                    parser: Optional[Callable[[str], List[Product]]] = None) -> Optional[CachedFeed]:
+        """Распарсенный фид салона из кэша (перечитывается только при изменении файла)"""
+        return self.cache.get(self.get_feed_path(salon_file),
+                              parser or self.load_products)
+
+    def get_products(self, salon_file: str) -> List[Product]:
+        """Товары салона без повторного чтения и парсинга фида"""
+        catalog = self.get_catalog(salon_file)
+        return catalog.products if catalog else []
+
+    def get_products_by_ids(self, salon_file: str, product_ids: List[str]) -> List[Product]:
+        """Товары салона по id в заданном порядке (отсутствующие в текущем фиде пропускаются)"""
+        catalog = self.get_catalog(salon_file)
+        if not catalog:
+            return []
+        if catalog.by_id is None:
+            catalog.by_id = {product.id: product for product in catalog.products}
+        by_id = catalog.by_id
+        return [by_id[product_id] for product_id in product_ids if product_id in by_id]
+
     def load_feed(self, salon_file: str) -> Optional[str]:
         """Загружаем фид салона"""
         try:
-            feed_path = f"{self.feeds_dir}/{salon_file}"
+            feed_path = self.get_feed_path(salon_file)
             print(f"📁 Загружаем фид: {feed_path}")
 
             with open(feed_path, 'r', encoding='utf-8') as f:
@@ -60,8 +86,9 @@ class FeedService:
             offers = root.findall('.//offer')
             print(f"📦 Найдено offer'ов: {len(offers)}")
 
+            params_pool = {}
             for offer in offers:
-                product = self._parse_offer(offer, categories)
+                product = self._parse_offer(offer, categories, params_pool)
                 if product:
                     products.append(product)
 
@@ -72,6 +99,81 @@ class FeedService:
             print(f"❌ Критическая ошибка парсинга фида: {e}")
             return []
 
+    def load_products(self, feed_path: str) -> List[Product]:
+        """Потоковый парсинг файла фида: весь текст и дерево XML в памяти не держим"""
+        try:
+            print(f"🔍 Потоковый парсинг фида: {feed_path}")
+            products = list(self.iter_feed(feed_path))
+            print(f"✅ Успешно распаршено товаров: {len(products)}")
+            return products
+        except ET.ParseError as e:
+            print(f"❌ Ошибка парсинга XML: {e}")
+            return []
+        except Exception as e:
+            print(f"❌ Критическая ошибка парсинга фида: {e}")
+            return []
+
+    def iter_feed(self, feed_path: str) -> Iterator[Product]:
+        """Лениво отдает товары фида через iterparse, очищая разобранные элементы.
+
+        Категории читаются первым проходом до начала <offers>. Если блок категорий
+        идет после товаров, товары с неразрешенной категорией откладываются до конца файла.
+        """
+        categories, categories_complete = self._scan_categories(feed_path)
+        deferred = []
+        stack = []
+        params_pool = {}
+
+        with open(feed_path, 'rb') as f:
+            for event, elem in ET.iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    stack.append(elem)
+                    continue
+                stack.pop()
+
+                if elem.tag == 'category':
+                    cat_id = elem.get('id')
+                    if cat_id and elem.text:
+                        categories[cat_id] = sys.intern(elem.text)
+                elif elem.tag == 'offer':
+                    product = self._parse_offer(elem, categories, params_pool)
+                    if product:
+                        if product.category_name is None and not categories_complete:
+                            deferred.append(product)
+                        else:
+                            yield product
+                else:
+                    continue
+
+                # Разобранный элемент больше не нужен — удаляем его из дерева
+                elem.clear()
+                if stack:
+                    stack[-1].remove(elem)
+
+        for product in deferred:
+            if product.category_id in categories:
+                product.category_name = categories[product.category_id]
+            yield product
+
+    def _scan_categories(self, feed_path: str) -> Tuple[Dict[str, str], bool]:
+        """Первый проход: категории до начала блока <offers>"""
+        categories = {}
+        complete = False
+        with open(feed_path, 'rb') as f:
+            for event, elem in ET.iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag == 'offers':
+                        break
+                    continue
+                if elem.tag == 'category':
+                    cat_id = elem.get('id')
+                    if cat_id and elem.text:
+                        categories[cat_id] = sys.intern(elem.text)
+                    elem.clear()
+                elif elem.tag == 'categories':
+                    complete = True
+        return categories, complete
+
     def _parse_categories(self, root: ET.Element) -> Dict[str, str]:
         """Парсим категории из XML"""
         categories = {}
@@ -82,7 +184,8 @@ class FeedService:
                 categories[cat_id] = cat_name
         return categories
 
-    def _parse_offer(self, offer: ET.Element, categories: Dict[str, str]) -> Optional[Product]:
+    def _parse_offer(self, offer: ET.Element, categories: Dict[str, str],
+                     params_pool: Optional[Dict[tuple, Dict[str, str]]] = None) -> Optional[Product]:
         """Парсим один товар"""
         try:
             # Проверяем доступность
@@ -90,20 +193,19 @@ class FeedService:
             if available != 'true':
                 return None
 
+            category_id = self._get_text(offer, 'categoryId')
             product = Product(
                 id=offer.get('id', ''),
                 name=self._get_text(offer, 'name'),
                 price=self._get_text(offer, 'price'),
                 url=self._get_text(offer, 'url'),
                 quantity=self._get_text(offer, 'step-quantity', '0'),
-                category_id=self._get_text(offer, 'categoryId'),
-                params=self._parse_params(offer)
+                category_id=category_id,
+                # Добавляем информацию о категории
+                category_name=categories.get(category_id),
+                params=intern_params(self._parse_params(offer), params_pool)
             )
 
-            # Добавляем информацию о категории
-            if product.category_id in categories:
-                product.category_name = categories[product.category_id]
-
             return product
 
         except Exception as e:
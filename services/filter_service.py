@@ -1,13 +1,15 @@
 # -*- coding: utf-8 -*-
 import re
 import sys
-from typing import List, Optional
+from typing import List, Optional, Set
 
 # Устанавливаем правильное кодирование для консоли Windows
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
 from models.product import Product
+from models.product_index import ProductIndex
+from services.feed_cache_service import CachedFeed
 
 
 class FilterService:
@@ -41,24 +43,56 @@ class FilterService:
             'optio': ['optio', 'оптио']
         }
 
-    def filter_products(self, question: str, products: List[Product]) -> List[Product]:
+    def get_index(self, catalog: CachedFeed) -> ProductIndex:
+        """Индекс фида строится один раз на каждую загрузку фида"""
+        if catalog.index is None:
+            catalog.index = ProductIndex(
+                catalog.products, self.brand_keywords.keys())
+        return catalog.index
+
+    def filter_products(self, question: str, products: List[Product],
+                        index: Optional[ProductIndex] = None) -> List[Product]:
         """Основной метод фильтрации товаров"""
         print(f"🔍 Фильтрация товаров по запросу: '{question}'")
 
         question_lower = question.lower()
-        filtered = []
 
         # Извлекаем критерии фильтрации
         target_size = self._extract_size(question)
         target_brands = self._extract_brands(question_lower)
 
-        for product in products:
-            if self._matches_criteria(product, question_lower, target_size, target_brands):
-                filtered.append(product)
+        if index is not None and index.products is products:
+            filtered = index.select(self._match_ids(
+                index, question_lower, target_size, target_brands))
+        else:
+            filtered = [product for product in products
+                        if self._matches_criteria(product, question_lower, target_size, target_brands)]
 
         print(f"✅ После фильтрации: {len(filtered)} товаров")
         return filtered
 
+    def _match_ids(self, index: ProductIndex, question: str,
+                   target_size: Optional[str], target_brands: List[str]) -> Optional[Set[int]]:
+        """Те же критерии, что и в _matches_criteria, но через пересечение постингов"""
+        ids = None
+
+        if target_size:
+            ids = index.ids_for_size(target_size)
+
+        if target_brands:
+            brand_ids = index.ids_for_brands(target_brands)
+            ids = brand_ids if ids is None else ids & brand_ids
+
+        # В _matches_criteria ветка elif срабатывает и для стелек, поэтому оба условия независимы
+        if 'стельк' in question:
+            category_ids = index.ids_for_category('insoles')
+            ids = category_ids if ids is None else ids & category_ids
+        if 'обув' in question:
+            category_ids = index.ids_for_category('footwear')
+            ids = category_ids if ids is None else ids & category_ids
+
+        return ids
+
     def _extract_size(self, question: str) -> Optional[str]:
         """Извлекает размер из вопроса"""
         size_match = re.search(r'\b(\d{2})\b', question)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Общий HTTP-клиент для исходящих запросов в Telegram и Bitrix24.
+
+Одна requests.Session с пулом соединений на каждый хост: TCP+TLS рукопожатие
+выполняется один раз, дальше соединение переиспользуется (keep-alive).
+У каждого запроса есть таймаут; на 429 и 5xx запрос повторяется с экспоненциальной
+паузой, а если сервер указал retry_after (Telegram: parameters.retry_after,
+Bitrix/прокси: заголовок Retry-After) — ждем ровно столько.
+"""
+import os
+import sys
+import time
+import threading
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from config import Config
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class OutboundHttpClient:
+    """Пул keep-alive соединений с таймаутами, повторами и счетчиком запросов в работе"""
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 10,
+                 timeout: Union[float, Tuple[float, float]] = (5.0, 15.0),
+                 max_retries: int = 3, backoff: float = 0.5, max_retry_delay: float = 30.0):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_retry_delay = max_retry_delay
+
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._session_pid: Optional[int] = None
+        self._hosts: Dict[str, int] = {}
+
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+
+    @property
+    def session(self) -> requests.Session:
+        # Сессия создается в том процессе, который шлет запросы: после fork
+        # (gunicorn preload_app) воркер не должен делить сокеты с мастером
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._lock:
+                if self._session is None or self._session_pid != pid:
+                    session = requests.Session()
+                    # Повторы делаем сами: urllib3 не знает про retry_after в теле ответа Telegram
+                    adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                                          pool_maxsize=self.pool_maxsize, max_retries=0)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session, self._session_pid = session, pid
+        return self._session
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def request(self, method: str, url: str, retries: Optional[int] = None, **kwargs) -> requests.Response:
+        """
+        Выполняет запрос через общий пул. Возвращает последний ответ (в том числе 429/5xx,
+        если повторы исчерпаны); исключение — только если так и не удалось соединиться.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        retries = self.max_retries if retries is None else retries
+        host = urlsplit(url).netloc
+        attempt = 0
+        while True:
+            self._enter(host)
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                # ReadTimeout не повторяем: сообщение могло уже уйти, повтор его задублирует
+                if attempt >= retries:
+                    self._count('failures')
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                print(f"⚠️ {host}: ошибка соединения ({e}), повтор через {delay:.1f}s")
+            except Exception:
+                self._count('failures')
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                if response.status_code == 429:
+                    self._count('rate_limited')
+                delay = self._retry_delay(response, attempt)
+                if attempt >= retries or delay is None:
+                    self._count('failures')
+                    return response
+                print(f"⚠️ {host}: HTTP {response.status_code}, повтор через {delay:.1f}s")
+            finally:
+                self._leave(host)
+            attempt += 1
+            self._count('retries')
+            time.sleep(delay)
+
+    def _retry_delay(self, response: requests.Response, attempt: int) -> Optional[float]:
+        """Пауза перед повтором; None — сервер просит ждать дольше max_retry_delay"""
+        retry_after = None
+        header = response.headers.get('Retry-After')
+        if header:
+            try:
+                retry_after = float(header)
+            except ValueError:
+                pass
+        if retry_after is None:
+            try:
+                retry_after = response.json().get('parameters', {}).get('retry_after')
+            except (ValueError, AttributeError):
+                pass
+        if retry_after is None:
+            return min(self.backoff * (2 ** attempt), self.max_retry_delay)
+        retry_after = float(retry_after)
+        return retry_after if retry_after <= self.max_retry_delay else None
+
+    def _enter(self, host: str) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self._hosts[host] = self._hosts.get(host, 0) + 1
+
+    def _leave(self, host: str) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._hosts[host] -= 1
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'in_flight_by_host': {host: n for host, n in self._hosts.items() if n},
+                'peak_in_flight': self.peak_in_flight,
+                'requests': self.requests,
+                'retries': self.retries,
+                'rate_limited': self.rate_limited,
+                'failures': self.failures,
+                'pool_maxsize': self.pool_maxsize,
+            }
+
+
+# Один клиент на процесс: app.py, BitrixChatService и utils.logger делят пул соединений
+outbound_client = OutboundHttpClient(
+    pool_connections=Config.HTTP_POOL_HOSTS,
+    pool_maxsize=Config.HTTP_POOL_SIZE,
+    timeout=(Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT),
+    max_retries=Config.HTTP_MAX_RETRIES,
+    backoff=Config.HTTP_RETRY_BACKOFF,
+    max_retry_delay=Config.HTTP_MAX_RETRY_DELAY,
+)
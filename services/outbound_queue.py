@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Очередь исходящих сообщений в Telegram и Bitrix24.
+
+Обработчики вебхуков только ставят ответ в очередь; отправляют его потоки очереди:
+- сообщения одного чата уходят строго по порядку и не чаще раза в chat_interval секунд
+  (Telegram: ~1 сообщение в секунду в чат);
+- общий token bucket на канал держит суммарную скорость в лимите API
+  (Telegram: ~30 сообщений в секунду, Bitrix24 REST: ~2 запроса в секунду);
+- ответы длиннее лимита (4096 символов у Telegram) режутся на части по абзацам;
+- вызовы API, которые должны идти после сообщений чата (перевод на оператора),
+  ставятся в ту же очередь задачей через enqueue_call.
+"""
+import sys
+import time
+import heapq
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from services.webhook_dispatcher import StageMetrics
+
+
+def split_message(text: str, limit: int = 4096) -> List[str]:
+    """Делит текст на части не длиннее limit: по абзацу, строке, пробелу, иначе жестко"""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind('\n\n', 0, limit)
+        if cut <= 0:
+            cut = text.rfind('\n', 0, limit)
+        if cut <= 0:
+            cut = text.rfind(' ', 0, limit)
+        if cut <= 0:
+            cut = limit
+        head, text = text[:cut].rstrip(), text[cut:].lstrip()
+        if head:
+            parts.append(head)
+    if text or not parts:
+        parts.append(text)
+    return parts
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше burst в запасе; acquire ждет свободный токен"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Забирает токен; возвращает, сколько секунд пришлось ждать"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                delay = (1.0 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+@dataclass
+class Channel:
+    """Канал доставки: send(chat_id, text) -> bool и его лимиты"""
+    name: str
+    send: Callable[[str, str], bool]
+    rate: float
+    chat_interval: float = 0.0
+    max_length: int = 4096
+
+
+@dataclass
+class _Delivery:
+    """Один ответ (возможно, из нескольких частей) и колбэки после доставки всех частей или сбоя"""
+    on_sent: Optional[Callable[[], None]] = None
+    on_failed: Optional[Callable[[], None]] = None
+    remaining: int = 0
+    failed: bool = False
+
+
+@dataclass
+class _Part:
+    channel: str
+    chat_id: str
+    text: str
+    delivery: _Delivery
+    # Задача вместо отправки текста (enqueue_call): вызов -> успех
+    call: Optional[Callable[[], bool]] = None
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class OutboundQueue:
+    """
+    Очередь с FIFO на каждый чат. Чаты, готовые к отправке, лежат в куче по времени,
+    когда им снова можно писать, поэтому поток не простаивает на чате, упершемся в chat_interval.
+    """
+
+    def __init__(self, channels: List[Channel], workers: int = 4, max_queued: int = 1000):
+        self.channels = {channel.name: channel for channel in channels}
+        self.buckets = {channel.name: TokenBucket(channel.rate) for channel in channels}
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.metrics = StageMetrics()
+
+        self._cond = threading.Condition()
+        self._chats: Dict[str, Deque[_Part]] = {}
+        self._ready: List[Tuple[float, int, str]] = []
+        self._busy: Set[str] = set()
+        self._next_allowed: Dict[str, float] = {}
+        self._seq = 0
+        self._queued = 0
+        self._threads: List[threading.Thread] = []
+
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+        self.split = 0
+        self.peak_queued = 0
+
+    def enqueue(self, channel: str, chat_id, text: str,
+                on_sent: Optional[Callable[[], None]] = None,
+                on_failed: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Ставит ответ в очередь чата. on_sent вызывается после успешной доставки всех частей,
+        on_failed — если хотя бы одна часть не доставлена.
+        Возвращает False, если очередь переполнена (ответ не будет отправлен).
+        """
+        spec = self.channels[channel]
+        chat_id = str(chat_id)
+        texts = split_message(text, spec.max_length)
+        delivery = _Delivery(on_sent=on_sent, on_failed=on_failed, remaining=len(texts))
+        if not self._push(channel, chat_id, [_Part(channel, chat_id, part, delivery) for part in texts]):
+            return False
+        if len(texts) > 1:
+            with self._cond:
+                self.split += 1
+        return True
+
+    def enqueue_call(self, channel: str, chat_id, call: Callable[[], bool], label: str,
+                     on_sent: Optional[Callable[[], None]] = None,
+                     on_failed: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Ставит в очередь чата задачу: call() выполнит поток очереди в порядке сообщений чата
+        и в лимите канала; False из call или исключение — сбой (on_failed).
+        label — подпись задачи для логов.
+        """
+        chat_id = str(chat_id)
+        delivery = _Delivery(on_sent=on_sent, on_failed=on_failed, remaining=1)
+        return self._push(channel, chat_id, [_Part(channel, chat_id, label, delivery, call)])
+
+    def _push(self, channel: str, chat_id: str, parts: List[_Part]) -> bool:
+        self._ensure_workers()
+        key = f"{channel}:{chat_id}"
+        with self._cond:
+            if self._queued + len(parts) > self.max_queued:
+                self.rejected += 1
+                return False
+            was_pending = key in self._chats
+            pending = self._chats.setdefault(key, deque())
+            pending.extend(parts)
+            self._queued += len(parts)
+            self.peak_queued = max(self.peak_queued, self._queued)
+            self.enqueued += 1
+            if not was_pending and key not in self._busy:
+                self._schedule(key, self._next_allowed.pop(key, 0.0))
+            self._cond.notify()
+        return True
+
+    def _schedule(self, key: str, ready_at: float) -> None:
+        self._seq += 1
+        heapq.heappush(self._ready, (ready_at, self._seq, key))
+
+    def _ensure_workers(self) -> None:
+        if self._threads:
+            return
+        with self._cond:
+            if not self._threads:
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f"outbound-sender-{i}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def _take(self) -> Tuple[str, _Part]:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._ready and self._ready[0][0] <= now:
+                    _, _, key = heapq.heappop(self._ready)
+                    self._busy.add(key)
+                    self._queued -= 1
+                    return key, self._chats[key].popleft()
+                self._cond.wait(self._ready[0][0] - now if self._ready else None)
+
+    def _release(self, key: str, interval: float) -> None:
+        with self._cond:
+            self._busy.discard(key)
+            ready_at = time.monotonic() + interval
+            if self._chats[key]:
+                self._schedule(key, ready_at)
+                self._cond.notify()
+            else:
+                del self._chats[key]
+                if interval > 0:
+                    self._next_allowed[key] = ready_at
+                    if len(self._next_allowed) > 10000:
+                        now = time.monotonic()
+                        self._next_allowed = {k: t for k, t in self._next_allowed.items() if t > now}
+
+    def _run(self) -> None:
+        while True:
+            key, part = self._take()
+            spec = self.channels[part.channel]
+            self.metrics.record(f"{part.channel}_queue_wait", time.perf_counter() - part.enqueued_at)
+            self.metrics.record(f"{part.channel}_rate_wait", self.buckets[part.channel].acquire())
+            started = time.perf_counter()
+            try:
+                ok = part.call() if part.call is not None else spec.send(part.chat_id, part.text)
+            except Exception as e:
+                print(f"❌ Ошибка отправки в {part.channel} ({part.chat_id}, {part.text[:50]}): {e}")
+                ok = False
+            self.metrics.record(f"{part.channel}_send", time.perf_counter() - started)
+            self._finish(part, ok)
+            self._release(key, spec.chat_interval)
+
+    def _finish(self, part: _Part, ok: bool) -> None:
+        delivery = part.delivery
+        with self._cond:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+                delivery.failed = True
+            delivery.remaining -= 1
+            finished = delivery.remaining == 0
+        if not finished:
+            return
+        callback = delivery.on_failed if delivery.failed else delivery.on_sent
+        if callback is not None:
+            try:
+                callback()
+            except Exception as e:
+                print(f"❌ Ошибка после доставки в {part.channel}: {e}")
+
+    def __len__(self) -> int:
+        return self._queued
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            stats = {
+                'workers': self.workers,
+                'queued': self._queued,
+                'max_queued': self.max_queued,
+                'peak_queued': self.peak_queued,
+                'chats_pending': len(self._chats),
+                'enqueued': self.enqueued,
+                'sent': self.sent,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'split': self.split,
+            }
+        stats['stages'] = self.metrics.get_stats()
+        return stats
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Optional
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+
+@dataclass
+class PendingMessage:
+    question: str
+    user_id: str
+    reply: Callable[[str], None]
+    enqueued_at: float
+    deadline: float
+
+
+class PendingMessageQueue:
+    """
+    Ограниченная очередь сообщений, пришедших во время прогрева индекса.
+    Когда сервис готов (ready_event), сообщения обрабатываются в порядке поступления;
+    если сервис не успел прогреться до дедлайна сообщения, отправляется fallback-ответ.
+    """
+
+    def __init__(self, process: Callable[[str, str], str], ready_event: threading.Event,
+                 max_size: int = 100, timeout: float = 60.0, fallback: str = ""):
+        self.process = process
+        self.ready_event = ready_event
+        self.max_size = max_size
+        self.timeout = timeout
+        self.fallback = fallback
+        self._queue: Deque[PendingMessage] = deque()
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+
+        self.accepted = 0
+        self.answered = 0
+        self.expired = 0
+        self.rejected = 0
+        self.errors = 0
+        self.max_wait_seconds = 0.0
+
+    def submit(self, question: str, user_id: str, reply: Callable[[str], None]) -> bool:
+        """Ставит сообщение в очередь; False, если очередь заполнена (ответить нужно сразу)"""
+        if self.max_size <= 0:
+            return False
+        now = time.monotonic()
+        with self._cond:
+            if len(self._queue) >= self.max_size:
+                self.rejected += 1
+                return False
+            self._queue.append(PendingMessage(question, user_id, reply, now, now + self.timeout))
+            self.accepted += 1
+            self._cond.notify()
+        self._ensure_worker()
+        return True
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def _ensure_worker(self) -> None:
+        with self._cond:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="pending-messages", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                head_deadline = self._queue[0].deadline
+
+            # Голова очереди — самое раннее сообщение и самый ранний дедлайн
+            if self.ready_event.wait(timeout=max(0.0, head_deadline - time.monotonic())):
+                message = self._pop()
+                if message is not None:
+                    self._answer(message)
+            else:
+                for message in self._pop_expired():
+                    self._deliver(message, self.fallback)
+                    self.expired += 1
+
+    def _pop(self) -> Optional[PendingMessage]:
+        with self._cond:
+            return self._queue.popleft() if self._queue else None
+
+    def _pop_expired(self):
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            while self._queue and self._queue[0].deadline <= now:
+                expired.append(self._queue.popleft())
+        return expired
+
+    def _answer(self, message: PendingMessage) -> None:
+        waited = time.monotonic() - message.enqueued_at
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        print(f"📬 Отвечаем на отложенное сообщение {message.user_id} (ждало {waited:.1f}s)")
+        try:
+            answer = self.process(message.question, message.user_id)
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ Ошибка обработки отложенного сообщения: {e}")
+            answer = self.fallback
+        self._deliver(message, answer)
+        self.answered += 1
+
+    def _deliver(self, message: PendingMessage, text: str) -> None:
+        try:
+            message.reply(text)
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ Ошибка отправки отложенного ответа {message.user_id}: {e}")
+
+    def get_stats(self) -> Dict:
+        return {
+            'depth': len(self._queue),
+            'max_size': self.max_size,
+            'timeout_seconds': self.timeout,
+            'accepted': self.accepted,
+            'answered': self.answered,
+            'expired': self.expired,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'max_wait_seconds': round(self.max_wait_seconds, 3),
+        }
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from utils.helpers import atomic_write
+
+
+class QueryEmbeddingCache:
+    """
+    LRU-кэш эмбеддингов запросов: нормализованный запрос → L2-нормализованный вектор.
+    Привязан к имени модели: при смене модели сохраненный кэш не загружается.
+    """
+
+    def __init__(self, model_name: str, max_size: int = 1024,
+                 persist_path: Optional[str] = None, persist_every: int = 50):
+        self.model_name = model_name
+        self.max_size = max_size
+        self.persist_path = persist_path
+        self.persist_every = persist_every
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+
+        if persist_path:
+            self.load()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.split())
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        if self.max_size <= 0:
+            return
+        vector = np.ascontiguousarray(vector, dtype=np.float32).reshape(1, -1)
+        # Вектор отдается всем запросам — защищаем от случайного изменения на месте
+        vector.setflags(write=False)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._unsaved += 1
+            should_save = self.persist_path and self._unsaved >= self.persist_every
+        if should_save:
+            self.save()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._unsaved = 0
+
+    def save(self, path: Optional[str] = None) -> bool:
+        """Сохраняет кэш на диск (атомарно, через временный файл)"""
+        path = path or self.persist_path
+        if not path:
+            return False
+        with self._lock:
+            keys = list(self._entries.keys())
+            vectors = [self._entries[k] for k in keys]
+            if path == self.persist_path:
+                self._unsaved = 0
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with atomic_write(path, 'wb') as f:
+                np.savez(
+                    f,
+                    model_name=np.array(self.model_name),
+                    keys=np.array(keys, dtype=str),
+                    vectors=np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32),
+                )
+            print(f"💾 Кэш эмбеддингов запросов сохранен: {len(keys)} записей")
+            return True
+        except Exception as e:
+            print(f"⚠️ Не удалось сохранить кэш эмбеддингов запросов: {e}")
+            return False
+
+    def load(self, path: Optional[str] = None) -> bool:
+        """
+        Загружает кэш с диска, если он построен той же моделью.
+        Уже закэшированные запросы не перезаписываются, размер не превышает max_size.
+        """
+        path = path or self.persist_path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data['model_name']) != self.model_name:
+                    print(f"ℹ️ Кэш эмбеддингов запросов от другой модели ({data['model_name']}), пропускаем")
+                    return False
+                keys = [str(k) for k in data['keys']]
+                vectors = data['vectors']
+            loaded = 0
+            for key, vector in zip(keys[-self.max_size:], vectors[-self.max_size:]):
+                vector = np.array(vector, dtype=np.float32).reshape(1, -1)
+                vector.setflags(write=False)
+                with self._lock:
+                    if key in self._entries or len(self._entries) >= self.max_size:
+                        continue
+                    self._entries[key] = vector
+                loaded += 1
+            print(f"✅ Кэш эмбеддингов запросов загружен: {loaded} записей")
+            return True
+        except Exception as e:
+            print(f"⚠️ Не удалось загрузить кэш эмбеддингов запросов: {e}")
+            return False
+
+    def get_stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'persist_path': self.persist_path,
+        }
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 import sys
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 # Устанавливаем правильное кодирование для консоли Windows
 if sys.stdout.encoding != 'utf-8':
@@ -9,32 +9,28 @@ if sys.stdout.encoding != 'utf-8':
 from models.product import Product
 from services.feed_service import FeedService
 from services.filter_service import FilterService
+from services.catalog_service import CatalogService
 
 
 class SearchService:
     def __init__(self, feed_service: FeedService, filter_service: FilterService):
         self.feed_service = feed_service
         self.filter_service = filter_service
+        self.catalog_service = CatalogService(feed_service, filter_service)
 
     def search_in_salon(self, question: str, salon_name: str, feed_file: str) -> List[Product]:
         """Поиск товаров в указанном салоне"""
         print(f"🔍 Поиск в салоне {salon_name}, файл: {feed_file}")
 
-        # Загружаем фид
-        feed_content = self.feed_service.load_feed(feed_file)
-        if not feed_content:
-            print(f"❌ Не удалось загрузить фид: {feed_file}")
-            return []
-
-        # Парсим товары
-        products = self.feed_service.parse_feed(feed_content)
-        if not products:
+        # Берем распарсенный фид из кэша (файл читается только при изменении)
+        catalog = self.feed_service.get_catalog(feed_file)
+        if not catalog or not catalog.products:
             print(f"📦 В салоне {salon_name} нет товаров")
             return []
 
-        # Фильтруем товары по запросу
+        # Фильтруем товары по запросу через индекс фида
         filtered_products = self.filter_service.filter_products(
-            question, products)
+            question, catalog.products, self.filter_service.get_index(catalog))
         print(f"🎯 Найдено товаров после фильтрации: {len(filtered_products)}")
 
         return filtered_products
@@ -44,19 +40,20 @@ class SearchService:
         print(f"🔍 Поиск по всем салонам: '{question}'")
         all_products = []
 
-        for salon_name, feed_file in self.feed_service.salons.items():
-            salon_products = self.search_in_salon(
-                question, salon_name, feed_file)
+        for salon_products in self.search_grouped_by_salon(question).values():
             all_products.extend(salon_products)
 
         print(f"🌐 Всего найдено товаров: {len(all_products)}")
         return all_products
 
+    def search_grouped_by_salon(self, question: str) -> Dict[str, List[Product]]:
+        """Поиск по объединенному каталогу всех салонов, результат по салонам"""
+        return self.catalog_service.search(question)
+
+    def warm_up(self, executor: str = "thread", max_workers: Optional[int] = None) -> None:
+        """Заранее парсит фиды всех салонов (пул потоков или процессов)"""
+        self.catalog_service.warm_up(executor, max_workers)
+
     def get_salon_products_count(self, salon_name: str, feed_file: str) -> int:
         """Получаем общее количество товаров в салоне"""
-        feed_content = self.feed_service.load_feed(feed_file)
-        if not feed_content:
-            return 0
-
-        products = self.feed_service.parse_feed(feed_content)
-        return len(products) if products else 0
+        return len(self.feed_service.get_products(feed_file))
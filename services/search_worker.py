@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Общий процесс модели и поиска для многопроцессного режима (gunicorn.conf.py).
+
+HTTP-воркеры не загружают модель сами: EmbeddingsBotService ходит в этот процесс через
+unix-сокет (multiprocessing.connection). Запросы всех воркеров попадают в один
+BatchingEncoder и кодируются общими батчами, модель в памяти одна.
+
+Запуск вручную: SEARCH_WORKER_AUTHKEY=<hex> python -m services.search_worker --socket /tmp/ortos-search.sock
+"""
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from config import Config
+
+
+class SearchWorkerServer:
+    """Принимает соединения воркеров; на каждое соединение — отдельный поток"""
+
+    def __init__(self, address: str, authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+        self.service = None
+        self.ready = threading.Event()
+        self.error: Optional[str] = None
+        self.requests = 0
+        self.connections = 0
+
+    def serve_forever(self) -> None:
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        threading.Thread(target=self._load_service, name="search-worker-init", daemon=True).start()
+        with Listener(self.address, family='AF_UNIX', authkey=self.authkey) as listener:
+            print(f"🔌 Процесс поиска слушает {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    # Неверный ключ или оборванное рукопожатие не должны останавливать сервер
+                    print(f"⚠️ Отклонено соединение с процессом поиска: {e}")
+                    continue
+                self.connections += 1
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def _load_service(self) -> None:
+        try:
+            from services.embeddings_service import prepare_embeddings_service
+            self.service = prepare_embeddings_service()
+        except Exception as e:
+            self.error = str(e)
+            print(f"❌ Процесс поиска не инициализирован: {e}")
+        finally:
+            self.ready.set()
+
+    def _serve_connection(self, conn: Connection) -> None:
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(('ok', self._dispatch(*request)))
+                except Exception as e:
+                    try:
+                        conn.send(('error', str(e)))
+                    except OSError:
+                        return
+
+    def _dispatch(self, command: str, *args):
+        if command == 'ping':
+            return {'ready': self.ready.is_set(), 'error': self.error,
+                    'kb_version': getattr(self.service, 'kb_version', None)}
+        if not self.ready.is_set():
+            raise RuntimeError("Процесс поиска еще инициализируется")
+        if self.service is None:
+            raise RuntimeError(f"Процесс поиска недоступен: {self.error}")
+        self.requests += 1
+        if command == 'search':
+            return self.service.search(*args)
+        if command == 'encode':
+            return self.service.encode_query(*args)
+        if command == 'stats':
+            stats = self.service.get_stats()
+            stats['search_worker'] = {'pid': os.getpid(), 'requests': self.requests,
+                                      'connections': self.connections}
+            return stats
+        raise ValueError(f"Неизвестная команда: {command}")
+
+
+class RemoteEmbeddingsService:
+    """
+    Клиент процесса поиска с интерфейсом EmbeddingsService (search, encode_query, get_stats).
+    Соединения переиспользуются из пула: параллельные запросы потоков воркера идут
+    по разным соединениям и батчатся уже в процессе поиска.
+    """
+
+    def __init__(self, address: str, authkey: bytes, timeout: float = 30.0):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        # Версия базы знаний процесса поиска (известна после wait_ready)
+        self.kb_version: Optional[str] = None
+        self._pool: "queue.LifoQueue[Connection]" = queue.LifoQueue()
+
+    def wait_ready(self, timeout: float) -> None:
+        """Ждет, пока процесс поиска загрузит модель и индексы"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                status = self._call('ping')
+                if status['ready']:
+                    if status['error']:
+                        raise RuntimeError(f"Процесс поиска не инициализирован: {status['error']}")
+                    self.kb_version = status['kb_version']
+                    print(f"✅ Процесс поиска готов: {self.address}")
+                    return
+            except (OSError, EOFError):
+                pass
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Процесс поиска не ответил за {timeout:.0f}s")
+            time.sleep(0.5)
+
+    def search(self, query: str, top_k: int = 5, min_score: float = 0.30) -> List[Tuple[Dict, float]]:
+        return [(doc, score) for doc, score in self._call('search', query, top_k, min_score)]
+
+    def encode_query(self, query: str) -> np.ndarray:
+        # Эмбеддинг только что выполненного поиска процесс поиска берет из своего кэша запросов
+        return self._call('encode', query)
+
+    def get_stats(self) -> Dict:
+        return self._call('stats')
+
+    def _call(self, *request):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = Client(self.address, family='AF_UNIX', authkey=self.authkey)
+        try:
+            conn.send(request)
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f"Процесс поиска не ответил за {self.timeout:.0f}s")
+            status, payload = conn.recv()
+        except BaseException:
+            # Ответ мог прийти позже — такое соединение больше не используем
+            conn.close()
+            raise
+        self._pool.put(conn)
+        if status == 'error':
+            raise RuntimeError(payload)
+        return payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Общий процесс модели и поиска")
+    parser.add_argument("--socket", default=Config.SEARCH_WORKER_SOCKET or "/tmp/ortos-search.sock")
+    args = parser.parse_args()
+    SearchWorkerServer(args.socket, Config.search_worker_authkey()).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+import threading
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+import numpy as np
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+
+@dataclass
+class SemanticEntry:
+    question: str
+    doc_ids: FrozenSet[str]
+    answer: str
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """
+    Кэш ответов LLM для перефразированных вопросов («сколько стоят стельки» / «цена на стельки»).
+
+    Эмбеддинги уже отвеченных вопросов (те же L2-нормализованные векторы, что и для поиска)
+    лежат в маленьком faiss.IndexFlatIP. Ответ переиспользуется, только если косинусная
+    близость не ниже threshold и поиск вернул тот же набор документов контекста — иначе
+    похожий по форме вопрос мог быть о другом. При переполнении удаляется самая старая
+    десятая часть записей, при смене версии базы знаний кэш очищается.
+    """
+
+    def __init__(self, max_size: int = 2000, threshold: float = 0.93, candidates: int = 5):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.candidates = candidates
+        self.kb_version: Optional[str] = None
+        self._index = None
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[SemanticEntry] = []
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.doc_mismatches = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def set_kb_version(self, kb_version: Optional[str]) -> None:
+        """Запоминает версию базы знаний; ответы, построенные по другой версии, удаляются"""
+        with self._lock:
+            if kb_version == self.kb_version:
+                return
+            if self._entries:
+                print(f"🧹 База знаний изменилась, кэш похожих вопросов очищен ({len(self._entries)} записей)")
+                self.invalidations += 1
+            self._reset()
+            self.kb_version = kb_version
+
+    def get(self, embedding: np.ndarray, doc_ids: Iterable[str]) -> Optional[str]:
+        """Ответ на ближайший похожий вопрос с тем же набором документов или None"""
+        doc_set = frozenset(doc_ids)
+        query = np.ascontiguousarray(embedding, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            if self._index is None or not self._entries or query.shape[1] != self._index.d:
+                self.misses += 1
+                return None
+            scores, positions = self._index.search(query, min(self.candidates, len(self._entries)))
+            similar_found = False
+            for score, pos in zip(scores[0], positions[0]):
+                if pos < 0 or score < self.threshold:
+                    break
+                similar_found = True
+                entry = self._entries[pos]
+                if entry.doc_ids == doc_set:
+                    self.hits += 1
+                    print(f"♻️ Похожий вопрос ({score:.3f}): {entry.question}")
+                    return entry.answer
+            if similar_found:
+                self.doc_mismatches += 1
+            self.misses += 1
+            return None
+
+    def put(self, embedding: np.ndarray, doc_ids: Iterable[str], answer: str, question: str = "") -> None:
+        if self.max_size <= 0 or not answer:
+            return
+        vector = np.ascontiguousarray(embedding, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            if self._index is None or vector.shape[1] != self._index.d:
+                self._reset(vector.shape[1])
+            if len(self._entries) >= self.max_size:
+                self._evict_oldest(max(1, self.max_size // 10))
+            self._vectors[len(self._entries)] = vector[0]
+            self._index.add(vector)
+            self._entries.append(SemanticEntry(question, frozenset(doc_ids), answer, time.time()))
+
+    def _reset(self, dim: Optional[int] = None) -> None:
+        self._entries = []
+        if dim is None:
+            self._index, self._vectors = None, None
+            return
+        import faiss
+        self._index = faiss.IndexFlatIP(dim)
+        # Векторы записей (по порядку добавления) — для пересборки индекса при вытеснении
+        self._vectors = np.zeros((max(self.max_size, 1), dim), dtype=np.float32)
+
+    def _evict_oldest(self, count: int) -> None:
+        # IndexFlatIP не умеет удалять без сдвига позиций — пересобираем индекс из оставшихся
+        # векторов; удаление пачкой делает пересборку редкой
+        self._entries = self._entries[count:]
+        remaining = len(self._entries)
+        self._vectors[:remaining] = self._vectors[count:count + remaining]
+        self._index.reset()
+        if remaining:
+            self._index.add(self._vectors[:remaining])
+        self.evictions += count
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'doc_mismatches': self.doc_mismatches,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'kb_version': self.kb_version,
+        }
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Хранилища состояния бота: кэш ответов, контексты поиска («еще») и сессии записи.
+
+MemoryBackend — словарь в памяти процесса (по умолчанию, как раньше).
+RedisBackend — общее хранилище для нескольких машин (STORAGE_BACKEND=redis, REDIS_URL):
+при rolling deploy на Fly пользователь может попасть на другую машину посреди записи
+или листания товаров, и его состояние не теряется.
+
+Значения — JSON: строки, числа, списки и словари (товары хранятся по id, не объектами).
+Длинные списки (id найденных товаров) хранятся отдельно через set_list и читаются
+страницами через get_list_range — в Redis это RPUSH/LRANGE, без передачи всего списка.
+"""
+import sys
+import json
+import time
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from config import Config
+
+if TYPE_CHECKING:
+    from redis import Redis
+
+
+class MemoryBackend:
+    """
+    Записи в памяти процесса. Просроченные удаляются при обращении и фоновым потоком
+    раз в sweep_interval секунд — иначе записи ушедших пользователей жили бы до перезапуска.
+    """
+
+    def __init__(self, sweep_interval: float = 60.0):
+        # ключ → (момент истечения по time.time() или None, значение)
+        self._data: Dict[str, Tuple[Optional[float], Any]] = {}
+        self._lock = threading.Lock()
+        self.sweep_interval = sweep_interval
+        self._sweeper: Optional[threading.Thread] = None
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and time.time() >= expires_at:
+                del self._data[key]
+                return None
+            return value
+
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        return [self.get(key) for key in keys]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._ensure_sweeper()
+        with self._lock:
+            self._data[key] = (time.time() + ttl if ttl else None, value)
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        self._ensure_sweeper()
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = (expires_at, value)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def keys(self, prefix: str = "") -> List[str]:
+        now = time.time()
+        with self._lock:
+            return [key for key, (expires_at, _) in self._data.items()
+                    if key.startswith(prefix) and (expires_at is None or now < expires_at)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def set_list(self, key: str, items: List[Any], ttl: Optional[float] = None) -> None:
+        self.set(key, tuple(items), ttl)
+
+    def get_list_range(self, key: str, start: int, stop: int) -> Optional[List[Any]]:
+        """Элементы списка [start, stop); None — списка нет (истек или вытеснен)"""
+        items = self.get(key)
+        return None if items is None else list(items[start:stop])
+
+    def count(self) -> int:
+        return len(self._data)
+
+    def sweep(self) -> int:
+        """Удаляет просроченные записи; возвращает их число"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (expires_at, _) in self._data.items()
+                       if expires_at is not None and now >= expires_at]
+            for key in expired:
+                del self._data[key]
+            self.expirations += len(expired)
+        return len(expired)
+
+    def _ensure_sweeper(self) -> None:
+        # Поток стартует при первой записи: после fork (gunicorn preload_app) — уже в воркере
+        if self._sweeper is not None or self.sweep_interval <= 0:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="storage-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            self.sweep()
+
+
+class RedisBackend:
+    """
+    Записи в Redis под префиксом namespace. TTL ставит сам Redis (SET PX),
+    пакетные операции идут одним round trip через pipeline / MGET.
+    """
+
+    def __init__(self, client: "Redis", prefix: str, scan_batch: int = 500):
+        self.client = client
+        self.prefix = prefix
+        self.scan_batch = scan_batch
+
+    @staticmethod
+    def _dumps(value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+    @staticmethod
+    def _loads(raw) -> Optional[Any]:
+        return json.loads(raw) if raw is not None else None
+
+    @staticmethod
+    def _px(ttl: Optional[float]) -> Optional[int]:
+        return max(1, int(ttl * 1000)) if ttl else None
+
+    def get(self, key: str) -> Optional[Any]:
+        return self._loads(self.client.get(self.prefix + key))
+
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        if not keys:
+            return []
+        return [self._loads(raw) for raw in self.client.mget([self.prefix + key for key in keys])]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.client.set(self.prefix + key, self._dumps(value), px=self._px(ttl))
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.set(self.prefix + key, self._dumps(value), px=self._px(ttl))
+        pipe.execute()
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def set_list(self, key: str, items: List[Any], ttl: Optional[float] = None) -> None:
+        name = self.prefix + key
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(name)
+        if items:
+            pipe.rpush(name, *(self._dumps(item) for item in items))
+            if ttl:
+                pipe.pexpire(name, self._px(ttl))
+        pipe.execute()
+
+    def get_list_range(self, key: str, start: int, stop: int) -> Optional[List[Any]]:
+        """Элементы списка [start, stop) одним round trip; None — списка нет"""
+        name = self.prefix + key
+        pipe = self.client.pipeline(transaction=False)
+        pipe.exists(name)
+        pipe.lrange(name, start, stop - 1)
+        exists, raw_items = pipe.execute()
+        if not exists:
+            return None
+        return [self._loads(raw) for raw in raw_items]
+
+    def _scan(self, prefix: str = "") -> Iterable[bytes]:
+        return self.client.scan_iter(match=f"{self.prefix}{prefix}*", count=self.scan_batch)
+
+    def keys(self, prefix: str = "") -> List[str]:
+        start = len(self.prefix)
+        return [(raw.decode('utf-8') if isinstance(raw, bytes) else raw)[start:] for raw in self._scan(prefix)]
+
+    def clear(self) -> None:
+        """Удаляет все ключи своего префикса пачками по scan_batch"""
+        pipe = self.client.pipeline(transaction=False)
+        pending = 0
+        for raw in self._scan():
+            pipe.delete(raw)
+            pending += 1
+            if pending >= self.scan_batch:
+                pipe.execute()
+                pending = 0
+        if pending:
+            pipe.execute()
+
+    def count(self) -> int:
+        return sum(1 for _ in self._scan())
+
+    def sweep(self) -> int:
+        # Просроченные ключи удаляет сам Redis
+        return 0
+
+
+class StoredMapping:
+    """
+    Словарь поверх хранилища (для BotService.user_sessions): in, [], del, get.
+    Значение — копия: после изменения сессии ее нужно записать обратно (mapping[key] = session).
+    """
+
+    def __init__(self, backend, ttl: Optional[float] = None):
+        self.backend = backend
+        self.ttl = ttl
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.backend.get(key)
+        return default if value is None else value
+
+    def __contains__(self, key: str) -> bool:
+        return self.backend.get(key) is not None
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.backend.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.backend.set(key, value, self.ttl)
+
+    def __delitem__(self, key: str) -> None:
+        self.backend.delete(key)
+
+
+_redis_client: Optional["Redis"] = None
+_redis_lock = threading.Lock()
+
+
+def get_redis_client() -> "Redis":
+    """Общий для процесса клиент Redis (пул соединений redis-py сам пересоздается после fork)"""
+    global _redis_client
+    if _redis_client is None:
+        with _redis_lock:
+            if _redis_client is None:
+                import redis
+                _redis_client = redis.Redis.from_url(Config.REDIS_URL)
+    return _redis_client
+
+
+def create_backend(namespace: str, client: Optional["Redis"] = None) -> Optional[RedisBackend]:
+    """
+    Redis-хранилище для namespace, если оно включено (STORAGE_BACKEND=redis) или передан
+    клиент (например, fakeredis.FakeRedis() в проверках); иначе None — хранилище в памяти.
+    """
+    if client is None:
+        if Config.STORAGE_BACKEND != 'redis':
+            return None
+        client = get_redis_client()
+    return RedisBackend(client, f"{Config.REDIS_PREFIX}{namespace}:")
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+import queue
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional
+
+import numpy as np
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+
+ACCEPTED = "accepted"
+DUPLICATE = "duplicate"
+OVERLOADED = "overloaded"
+
+
+class StageMetrics:
+    """Время этапов обработки сообщения (скользящее окно): очередь, поиск, LLM, лог, отправка"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            if stage not in self._samples:
+                self._samples[stage] = deque(maxlen=self.window)
+                self._counts[stage] = 0
+            self._samples[stage].append(seconds)
+            self._counts[stage] += 1
+
+    def get_stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            snapshot = {stage: (np.array(samples) * 1000.0, self._counts[stage])
+                        for stage, samples in self._samples.items()}
+        stats = {}
+        for stage, (samples_ms, count) in snapshot.items():
+            p50, p95 = np.percentile(samples_ms, [50, 95])
+            stats[stage] = {'count': count, 'p50_ms': round(float(p50), 1),
+                            'p95_ms': round(float(p95), 1), 'max_ms': round(float(samples_ms.max()), 1)}
+        return stats
+
+
+class WebhookDispatcher:
+    """
+    Ограниченный пул обработчиков входящих сообщений: вебхук сразу отвечает 200,
+    а ответ пользователю формируется и отправляется в фоне.
+    Повторные доставки одного и того же апдейта (по update_id / id сообщения) отбрасываются.
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 200, dedup_size: int = 10000):
+        self.workers = max(1, workers)
+        self.dedup_size = dedup_size
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self.metrics = StageMetrics()
+
+        self.accepted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def submit(self, dedup_key: Optional[str], handler: Callable[[Dict[str, float]], None]) -> str:
+        """
+        Ставит обработчик в очередь. handler(timings) заполняет timings длительностями этапов.
+        Возвращает ACCEPTED, DUPLICATE или OVERLOADED (очередь заполнена — вебхук стоит повторить).
+        """
+        self._ensure_workers()
+        with self._lock:
+            if dedup_key is not None and dedup_key in self._seen:
+                self._seen.move_to_end(dedup_key)
+                self.duplicates += 1
+                return DUPLICATE
+            try:
+                self._queue.put_nowait((handler, time.perf_counter()))
+            except queue.Full:
+                # Ключ не запоминаем: повторная доставка должна быть обработана
+                self.rejected += 1
+                return OVERLOADED
+            if dedup_key is not None:
+                self._seen[dedup_key] = None
+                while len(self._seen) > self.dedup_size:
+                    self._seen.popitem(last=False)
+            self.accepted += 1
+        return ACCEPTED
+
+    def _ensure_workers(self) -> None:
+        if self._threads:
+            return
+        with self._lock:
+            if not self._threads:
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f"webhook-worker-{i}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def _run(self) -> None:
+        while True:
+            handler, enqueued_at = self._queue.get()
+            started = time.perf_counter()
+            self.metrics.record('queue_wait', started - enqueued_at)
+            timings: Dict[str, float] = {}
+            try:
+                handler(timings)
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Ошибка фоновой обработки сообщения: {e}")
+            finally:
+                for stage, seconds in timings.items():
+                    self.metrics.record(stage, seconds)
+                self.metrics.record('total', time.perf_counter() - enqueued_at)
+                self._queue.task_done()
+
+    def get_stats(self) -> Dict:
+        return {
+            'workers': self.workers,
+            'queue_depth': self._queue.qsize(),
+            'max_queue': self._queue.maxsize,
+            'accepted': self.accepted,
+            'duplicates': self.duplicates,
+            'rejected': self.rejected,
+            'failed': self.failed,
+            'stages': self.metrics.get_stats(),
+        }
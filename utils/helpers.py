@@ -1,13 +1,33 @@
 # -*- coding: utf-8 -*-
+import os
 import re
 import sys
-from typing import Optional, List
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional, List
 
 # Устанавливаем правильное кодирование для консоли Windows
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
 
+@contextmanager
+def atomic_write(path: str, mode: str = 'w') -> Iterator[IO]:
+    """
+    Запись файла целиком или никак: пишем во временный файл рядом и заменяем им path
+    (os.replace). Читатели, в том числе отобразившие старый файл в память, не видят
+    недописанного файла; при ошибке временный файл удаляется
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, mode, encoding=None if 'b' in mode else 'utf-8') as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
 def extract_size_from_question(question: str) -> Optional[str]:
     """Извлекает размер из вопроса"""
     size_match = re.search(r'\b(\d{2})\b', question.lower())
@@ -54,3 +74,25 @@ def format_products_for_prompt(products: List, max_products: int = 15) -> str:
         products_text += f"{name} | {price}р | {size} | {url}\n"
 
     return products_text
+
+
+def load_sample_questions(results_path: str, logs_path: str, limit: Optional[int] = None) -> List[str]:
+    """Реальные вопросы пользователей: прогон test_30_questions.py и журнал чатов (без повторов)"""
+    questions = []
+    try:
+        with open(results_path, 'r', encoding='utf-8') as f:
+            for match in re.finditer(r'❓ ВОПРОС \d+: (.+)', f.read()):
+                questions.append(match.group(1).strip().strip('"'))
+    except FileNotFoundError:
+        pass
+    try:
+        with open(logs_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                match = re.search(r'\| Вопрос: (.+?) \| Ответ:', line)
+                if match:
+                    question = match.group(1).strip()
+                    if len(question) > 8 and question not in questions:
+                        questions.append(question)
+    except FileNotFoundError:
+        pass
+    return questions[:limit] if limit else questions
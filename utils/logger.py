@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
 import os
 import sys
-import requests
 from datetime import datetime, timedelta
 from config import Config
+from services.http_client import outbound_client
 
 # Устанавливаем правильное кодирование для консоли Windows
 if sys.stdout.encoding != 'utf-8':
@@ -53,7 +53,7 @@ def log_message(user_name: str, user_id: str, message: str, response: str) -> No
 def send_telegram_message(chat_id: str, text: str) -> bool:
     """Отправка сообщения в Telegram"""
     try:
-        response = requests.post(
+        response = outbound_client.post(
             Config.TELEGRAM_URL + "/sendMessage",
             json={
                 "chat_id": chat_id,